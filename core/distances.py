@@ -1,6 +1,7 @@
 import numpy as np
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
 from tslearn.metrics import dtw
-from .matrix_profile import subsequences_indexes, join_matrix_profile, calc_MPdist
+from .matrix_profile import valid_segments, segments_indexes, join_matrix_profile, calc_MPdist
 from enum import Enum
 class DistanceType(Enum):
     EUCLIDEAN = 0
@@ -21,17 +22,53 @@ def ts_euclidean_distance(ts_A, ts_B):
     #return (np.power(np.power(x_1 - x_2, 2).sum(), 1/2)) / float(len(x_1))
     return np.linalg.norm(ts_A - ts_B)
 
-def ts_dtw_distance(ts_A, ts_B):
+def ts_dtw_distance(ts_A, ts_B, window = None):
     """
     Dynamic Time Warping distance for temporal series
     Args:
         ts_A (Tuple, list or np.ndarray): ts to compare
         ts_B (Tuple, list or np.ndarray): ts to compare
+        window (int, optional): Sakoe-Chiba band radius, unconstrained if None. Defaults to None.
 
     Returns:
         float: distance
     """
-    return dtw(ts_A, ts_B)
+    if window is None:
+        return dtw(ts_A, ts_B)
+    return dtw(ts_A, ts_B, global_constraint="sakoe_chiba", sakoe_chiba_radius=window)
+
+def lb_keogh_envelopes(X, window = None):
+    """
+    Upper and lower LB_Keogh envelopes of each row of X
+    Args:
+        X (np.ndarray): (N, T) array with one serie per row
+        window (int, optional): Sakoe-Chiba band radius, the whole serie if None. Defaults to None.
+
+    Returns:
+        (np.ndarray, np.ndarray): (N, T) upper and lower envelopes
+    """
+    if window is None:
+        window = X.shape[1] - 1
+    size = 2 * window + 1
+    upper = maximum_filter1d(X, size=size, axis=1, mode='nearest')
+    lower = minimum_filter1d(X, size=size, axis=1, mode='nearest')
+    return upper, lower
+
+def lb_keogh(ts, upper, lower):
+    """
+    LB_Keogh lower bound of the DTW distance between ts and the series 
+    enclosed by the envelopes
+    Args:
+        ts (np.ndarray): serie of length T
+        upper (np.ndarray): (T,) or (N, T) upper envelopes
+        lower (np.ndarray): (T,) or (N, T) lower envelopes
+
+    Returns:
+        float or np.ndarray: lower bound for each envelope
+    """
+    above = np.maximum(ts - upper, 0)
+    below = np.maximum(lower - ts, 0)
+    return np.sqrt(np.sum(above ** 2 + below ** 2, axis=-1))
 
 def ts_mp_distance(ts_A, ts_B, L):
     """
@@ -43,10 +80,12 @@ def ts_mp_distance(ts_A, ts_B, L):
     Returns:
         float: distance
     """
-    indexes_A = subsequences_indexes(ts_A, L)
-    indexes_B = subsequences_indexes(ts_B, L)
+    segments_A = valid_segments(np.asarray(ts_A, dtype=float), L)
+    segments_B = valid_segments(np.asarray(ts_B, dtype=float), L)
+    indexes_A = segments_indexes(segments_A, L)
+    indexes_B = segments_indexes(segments_B, L)
     
-    joinMatrixProfile = join_matrix_profile(ts_A, indexes_A, ts_B, indexes_B, L)
+    joinMatrixProfile = join_matrix_profile(ts_A, indexes_A, ts_B, indexes_B, L, segments_A=segments_A, segments_B=segments_B)
     return calc_MPdist(joinMatrixProfile, len(indexes_A) + len(indexes_B))
 
 def euclidean_distance(m_1, m_2):
@@ -0,0 +1,144 @@
+import numpy as np
+from scipy import sparse
+from .mtserie import MTSerie
+from .distances import ts_dtw_distance, DistanceType
+
+
+def _euclidean_distances_to(Z):
+    def distances_to(i, candidates):
+        return np.linalg.norm(Z[candidates] - Z[i], axis=1)
+    return distances_to
+
+def _dtw_distances_to(series, alphas, window):
+    def distances_to(i, candidates):
+        distances = np.zeros(len(candidates))
+        for values, alpha in zip(series, alphas):
+            distances = distances + (alpha ** 2) * np.array(
+                [ts_dtw_distance(values[i], values[j], window) ** 2 for j in candidates])
+        return np.sqrt(distances)
+    return distances_to
+
+def _merge_neighbors(indices, distances, isNew, i, candidates, candidateDistances, k):
+    """
+    Merges candidates into the neighbors of i, returns the number of new neighbors
+    """
+    allIndices = np.concatenate([indices[i], candidates])
+    allDistances = np.concatenate([distances[i], candidateDistances])
+    allIsNew = np.concatenate([isNew[i], np.ones(len(candidates), dtype=bool)])
+
+    # * current neighbors come first, so np.unique keeps their flags
+    allIndices, first = np.unique(allIndices, return_index=True)
+    allDistances = allDistances[first]
+    allIsNew = allIsNew[first]
+
+    best = np.argpartition(allDistances, k - 1)[:k]
+    best = best[np.argsort(allDistances[best])]
+    updates = np.count_nonzero(~np.isin(allIndices[best], indices[i]))
+
+    indices[i] = allIndices[best]
+    distances[i] = allDistances[best]
+    isNew[i] = allIsNew[best]
+    return updates
+
+def nn_descent(N, k, distances_to, max_iter = 10, delta = 0.001, random_state = None):
+    """
+    Approximate k nearest neighbors with NN-descent (Dong et al., "Efficient
+    k-nearest neighbor graph construction for generic similarity measures").
+    Neighbors of neighbors are iteratively compared, so only O(N * k^2) distances
+    are evaluated per iteration.
+
+    Args:
+        N (int): number of elements
+        k (int): number of neighbors
+        distances_to (function): distances_to(i, candidates) returns the distances between
+            element i and each element in the int array candidates
+        max_iter (int, optional): maximum number of iterations. Defaults to 10.
+        delta (float, optional): stops when less than delta * N * k neighbors change in an iteration. Defaults to 0.001.
+        random_state (int, optional): seed of the random initialization. Defaults to None.
+
+    Returns:
+        (np.ndarray, np.ndarray): (N, k) neighbors indexes and distances, sorted by distance
+    """
+    assert 0 < k < N
+    rng = np.random.RandomState(random_state)
+
+    indices = np.zeros([N, k], dtype=int)
+    distances = np.zeros([N, k])
+    for i in range(N):
+        candidates = rng.choice(N - 1, size=k, replace=False)
+        candidates[candidates >= i] += 1
+        candidateDistances = distances_to(i, candidates)
+        order = np.argsort(candidateDistances)
+        indices[i] = candidates[order]
+        distances[i] = candidateDistances[order]
+    isNew = np.ones([N, k], dtype=bool)
+
+    for _ in range(max_iter):
+        # * reverse neighbors, so that candidates are explored in both directions
+        reverse = [[] for _ in range(N)]
+        for i in range(N):
+            for j in indices[i]:
+                reverse[j].append(i)
+
+        newNeighbors = [indices[i][isNew[i]] for i in range(N)]
+        isNew[:] = False
+
+        updates = 0
+        for i in range(N):
+            neighbors = np.union1d(indices[i], reverse[i]).astype(int)
+            # * only neighbors of neighbors reached through a new link are compared again
+            candidates = [newNeighbors[j] for j in neighbors]
+            candidates = candidates + [indices[j] for j in newNeighbors[i]]
+            if len(candidates) == 0:
+                continue
+            candidates = np.setdiff1d(np.concatenate(candidates + [np.array(reverse[i], dtype=int)]),
+                                      np.append(indices[i], i))
+            if len(candidates) == 0:
+                continue
+            updates = updates + _merge_neighbors(indices, distances, isNew, i, candidates,
+                                                 distances_to(i, candidates), k)
+
+        if updates <= delta * N * k:
+            break
+
+    return indices, distances
+
+def knn_graph(mtseries, k, variables, alphas, distanceType = DistanceType.EUCLIDEAN, window = None,
+              max_iter = 10, random_state = None):
+    """
+    Approximate k nearest neighbors graph of multivariate time series under the
+    combined distance sqrt(sum_k alpha_k^2 * D_k^2) used by [distance_matrix]
+
+    Args:
+        mtseries (List of MTSerie): Multivariate time series list
+        k (int): number of neighbors
+        variables (List of str): Time dependent variables to use
+        alphas (List of float): weigth for each variable
+        distanceType (DistanceType, optional): Distance to compare mtseries. Defaults to DistanceType.EUCLIDEAN.
+        window (int, optional): Sakoe-Chiba band radius used by DTW. Defaults to None.
+        max_iter (int, optional): maximum number of NN-descent iterations. Defaults to 10.
+        random_state (int, optional): seed of the random initialization. Defaults to None.
+
+    Returns:
+        scipy.sparse.csr_matrix: (N, N) matrix with the distance to the k neighbors of each row
+    """
+    assert len(variables) == len(alphas)
+    N = len(mtseries)
+    for mtserie in mtseries:
+        assert isinstance(mtserie, MTSerie)
+
+    series = [[mtserie.get_serie(varName) for mtserie in mtseries] for varName in variables]
+    if distanceType == DistanceType.EUCLIDEAN:
+        # * the combined euclidean distance is the distance between the weighted concatenated series
+        Z = np.hstack([alpha * np.array(values, dtype=float) for values, alpha in zip(series, alphas)])
+        distances_to = _euclidean_distances_to(Z)
+    elif distanceType == DistanceType.DTW:
+        distances_to = _dtw_distances_to(series, alphas, window)
+    else:
+        raise ValueError("Unsupported distance type")
+
+    k = min(k, N - 1)
+    indices, distances = nn_descent(N, k, distances_to, max_iter=max_iter, random_state=random_state)
+
+    rows = np.repeat(np.arange(N), k)
+    return sparse.csr_matrix((distances.ravel(), (rows, indices.ravel())), shape=(N, N))
@@ -1,9 +1,15 @@
 import math
+import multiprocessing
+from functools import partial
 import numpy as np
-from .utils import is_array_like, zNormalize, clean_nan_inf, to_np_array
-from matrixprofile.algorithms.pairwise_dist import pairwise_dist
+from .utils import is_array_like, zNormalize, clean_nan_inf, to_np_array, pairwise_condensed
 from scipy.spatial.distance import squareform
-import mass_ts as mass_ts
+from .matrixprofile import matrixProfile as mpts
+from .matrixprofile.scrimp import scrimp_plus_plus
+from .matrixprofile.motifs import motifs
+from .matrixprofile.utils import mass as squared_mass
+from .matrixprofile.pmp import pan_matrix_profile
+from .profile_cache import get_profile_cache
 
 
 
@@ -24,11 +30,42 @@ def zNormalize_euclidian(tsA,tsB):
 
     return np.linalg.norm(zNormalize(tsA.astype("float64")) - zNormalize(tsB.astype("float64")))
 
-def _sequences_indexes(ts, L, begin = 0):
-    n = len(ts)
-    if n < L:
-        return []
-    return list(range(begin, begin + n - L + 1))
+def valid_segments(ts, L):
+    """
+    Get the runs of values without Nan or Inf values in the time serie ts 
+    that are long enough to contain a window of length L.
+
+    Args:
+        ts (np.ndarray): temporal serie
+        L (int): length of window
+
+    Returns:
+        np.ndarray: (S, 2) int array with the begin and (exclusive) end of each run
+    """
+    isMissing = np.isinf(ts) | np.isnan(ts)
+    # * missing values are added at both ends so every run has a begin and an end
+    changes = np.diff(np.concatenate([[1], isMissing.astype(np.int8), [1]]))
+    begins = np.flatnonzero(changes == -1)
+    ends = np.flatnonzero(changes == 1)
+    longEnough = (ends - begins) >= L
+    return np.stack([begins[longEnough], ends[longEnough]], axis=1)
+
+def segments_indexes(segments, L):
+    """
+    Get the start of every subsequence of length L inside the runs 
+    returned by [valid_segments].
+
+    Args:
+        segments (np.ndarray): (S, 2) int array with the begin and (exclusive) end of each run
+        L (int): length of window
+
+    Returns:
+        np.ndarray: int array with the start of each subsequence of length L
+    """
+    counts = segments[:, 1] - segments[:, 0] - L + 1
+    # * offset of each start inside its segment, obtained without a python loop
+    offsets = np.arange(np.sum(counts)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return (np.repeat(segments[:, 0], counts) + offsets).astype(int)
 
 def subsequences_indexes(ts, L):
     """
@@ -43,34 +80,9 @@ def subsequences_indexes(ts, L):
         List: indexes of the start of each subsequence of length L
     """
     if not is_array_like(ts):
-        return ValueError("Time serie structure is not an array")
-    isMissing = (np.isinf(ts) | np.isnan(ts))
-    n = len(ts)
-    
-    isLastValueNan = True
-    firstIndex = None
-    lastIndex = None
-    currIndex = 0
-    sequencesIndexes = []
-    
-    while currIndex != n:
-        if isMissing[currIndex]:
-            lastIndex = currIndex
-        if isLastValueNan and not isMissing[currIndex]:
-            firstIndex = currIndex
-        if firstIndex != None and lastIndex != None:
-            if(lastIndex > firstIndex):
-                indexes = _sequences_indexes(ts[firstIndex: lastIndex], L, begin=firstIndex)
-                sequencesIndexes = sequencesIndexes + indexes
-                firstIndex = None
-                lastIndex = None
-        
-        isLastValueNan = isMissing[currIndex]
-        currIndex = currIndex + 1
-    if firstIndex != None:
-        indexes = _sequences_indexes(ts[firstIndex: ], L, begin=firstIndex)
-        sequencesIndexes = sequencesIndexes + indexes
-    return sequencesIndexes
+        raise ValueError("Time serie structure is not an array")
+    ts = np.asarray(ts, dtype=float)
+    return segments_indexes(valid_segments(ts, L), L).tolist()
 
 
 def naive_distance_profile(tsA,idx,m, searchIndexes = None, tsB = None):
@@ -113,7 +125,11 @@ def naive_distance_profile(tsA,idx,m, searchIndexes = None, tsB = None):
                 dp[i] = np.inf
     return dp, indexes
 
-def mass_distance_profile(tsA,idx,m, searchIndexes = None, tsB = None):
+def _run_distance_profile(run, query):
+    # * one distance for each of the len(run) - m + 1 subsequences of the run
+    return np.sqrt(np.maximum(squared_mass(query, run), 0))
+
+def mass_distance_profile(tsA,idx,m, searchIndexes = None, tsB = None, segments = None):
     """
     Returns the distance profile of a query within tsA against the time 
     series tsB using the naive all-pairs comparison.
@@ -125,6 +141,8 @@ def mass_distance_profile(tsA,idx,m, searchIndexes = None, tsB = None):
     m: Length of query.
     tsB: Time series to compare the query against. Note that, if no value is provided, tsB = tsA by default.
     searchIndexes: sequences indexes of tsB that don't have Nan or Inf values
+    segments: runs of tsB without Nan or Inf values, as returned by valid_segments. If given 
+        each run is searched directly instead of being recovered from searchIndexes
     
     modified from https://github.com/matrix-profile-foundation/matrixprofile repository
     """
@@ -135,6 +153,15 @@ def mass_distance_profile(tsA,idx,m, searchIndexes = None, tsB = None):
         tsB = tsA
 
     query = tsA[idx: (idx+m)]
+    
+    if segments is not None:
+        if len(segments) == 0:
+            return [np.Inf], [0]
+        dp = np.concatenate([_run_distance_profile(tsB[begin: end], query) for begin, end in segments])
+        if selfJoin:
+            dp[np.abs(searchIndexes - idx) <= np.round(m/2)] = np.inf
+        return dp, searchIndexes
+    
     distanceProfile = np.array([])
     distanceProfileIds = []
     
@@ -150,10 +177,10 @@ def mass_distance_profile(tsA,idx,m, searchIndexes = None, tsB = None):
     for i in range(1, len(searchIndexes)):
         if indexes[i]!= indexes[i - 1] + 1: 
             segment = tsB[segmentStart: indexes[i - 1] + m]
-            segmentDistances = mass_ts.mass(segment, query)
+            segmentDistances = _run_distance_profile(segment, query)
             segmentStart = indexes[i]
             distanceProfile = np.concatenate([distanceProfile, segmentDistances])
-    segmentDistances = mass_ts.mass(tsB[segmentStart: indexes[-1] + m], query)
+    segmentDistances = _run_distance_profile(tsB[segmentStart: indexes[-1] + m], query)
     distanceProfile = np.concatenate([distanceProfile, segmentDistances])
 
     dp = distanceProfile
@@ -186,9 +213,43 @@ def _self_join_or_not_preprocess(tsA, tsB, m):
 
 
 
-def matrix_profile(ts_A, indexes_A, ts_B, indexes_B, L):
+def ab_join(ts_A, ts_B, L, segments_A = None, segments_B = None):
     """
-    Function for calculating the Matrix Profile
+    AB-join of two time series that may contain Nan or Inf values, computed 
+    with [prepared_ab_join] on the series prepared by [prepare_mpdist_serie]. 
+    Subsequences outside the valid runs (see [valid_segments]) are never matched.
+
+    Args:
+        ts_A (np.ndarray): Time series containing the queries
+        ts_B (np.ndarray): Time series to compare the queries against
+        L (int): window length
+        segments_A (np.ndarray, optional): runs of ts_A without Nan values. Defaults to None.
+        segments_B (np.ndarray, optional): runs of ts_B without Nan values. Defaults to None.
+
+    Returns:
+        (np.ndarray, np.ndarray): AB matrix profile (Nan on subsequences of ts_A with missing values, 
+        Inf if ts_B has no valid subsequence) and the index of the nearest subsequence of ts_B (-1 if none)
+    """
+    ts_A = np.asarray(ts_A, dtype=float)
+    ts_B = np.asarray(ts_B, dtype=float)
+    n_fft = max(len(ts_A), len(ts_B))
+    A = prepare_mpdist_serie(ts_A, L, n_fft, segments=segments_A)
+    B = prepare_mpdist_serie(ts_B, L, n_fft, segments=segments_B)
+    
+    profile = np.full(len(A['valid']), np.nan)
+    index = np.full(len(profile), -1, dtype=int)
+    profile[A['valid']] = np.inf
+    if not np.any(A['valid']) or not np.any(B['valid']):
+        return profile, index
+    
+    profile_AB, index_AB, _, _ = prepared_ab_join(A, B, L, n_fft, return_index=True)
+    profile[A['valid']] = profile_AB[A['valid']]
+    index[A['valid']] = index_AB[A['valid']]
+    return profile, index
+
+def matrix_profile(ts_A, indexes_A, ts_B, indexes_B, L, segments_B = None, segments_A = None):
+    """
+    Function for calculating the Matrix Profile, see [ab_join]
 
     Args:
         ts_A (List or np.ndarray): Time series containing the queries for which to calculate the Matrix Profile.
@@ -196,23 +257,19 @@ def matrix_profile(ts_A, indexes_A, ts_B, indexes_B, L):
         ts_B (List or np.ndarray): Time series to compare the query against. Note that, if no value is provided, ts_b = ts_a by default.
         indexes_B ([type]): Indexes of subsequences of ts_B
         L (int): window length
+        segments_B (np.ndarray, optional): runs of ts_B without Nan values, see [valid_segments]
+        segments_A (np.ndarray, optional): runs of ts_A without Nan values, see [valid_segments]
 
     Returns:
         np.ndarray : matrix profile distances
     """
-    matrix_profile_AB = np.zeros(len(ts_A) - L + 1)
-    matrix_profile_AB[:] = np.NaN
-    for index_A in indexes_A:
-        # dist, _ = naive_distance_profile(ts_A, index_A, L, searchIndexes=indexes_B, tsB = ts_B)
-        dist, _ = mass_distance_profile(ts_A, index_A, L, searchIndexes=indexes_B, tsB = ts_B)
-        if len(dist) == 0:
-            matrix_profile_AB[index_A] = np.Inf
-        else:    
-            min_pos = np.argmin(dist)
-            matrix_profile_AB[index_A] = dist[min_pos]      
+    profile, _ = ab_join(ts_A, ts_B, L, segments_A=segments_A, segments_B=segments_B)
+    matrix_profile_AB = np.full(len(profile), np.nan)
+    indexes_A = np.asarray(indexes_A, dtype=int)
+    matrix_profile_AB[indexes_A] = profile[indexes_A]
     return matrix_profile_AB
 
-def join_matrix_profile(ts_A, indexes_A, ts_B, indexes_B, L):
+def join_matrix_profile(ts_A, indexes_A, ts_B, indexes_B, L, segments_A = None, segments_B = None):
     """
     Function to obtain an array containing the euclidean distances for each subsequence in ts_A and ts_B to its nearest neighbour in ts_B and ts_A respectively
 
@@ -222,12 +279,30 @@ def join_matrix_profile(ts_A, indexes_A, ts_B, indexes_B, L):
         ts_B (List or np.ndarray): Temporal series #2
         indexes_B (List or np.ndarray): Indexes of subsequences of ts_B
         L (int): window length
+        segments_A (np.ndarray, optional): runs of ts_A without Nan values, see [valid_segments]
+        segments_B (np.ndarray, optional): runs of ts_B without Nan values, see [valid_segments]
 
     Returns:
         np.ndarray: join matrix profile distances
     """
-    matrixProfile_AB = matrix_profile(ts_A, indexes_A, ts_B, indexes_B, L)
-    matrixProfile_BA = matrix_profile(ts_B, indexes_B, ts_A, indexes_A, L)
+    ts_A = np.asarray(ts_A, dtype=float)
+    ts_B = np.asarray(ts_B, dtype=float)
+    n_fft = max(len(ts_A), len(ts_B))
+    A = prepare_mpdist_serie(ts_A, L, n_fft, segments=segments_A)
+    B = prepare_mpdist_serie(ts_B, L, n_fft, segments=segments_B)
+    
+    # * a single join gives both directions
+    profile_AB = np.full(len(A['valid']), np.inf)
+    profile_BA = np.full(len(B['valid']), np.inf)
+    if np.any(A['valid']) and np.any(B['valid']):
+        profile_AB, profile_BA = prepared_ab_join(A, B, L, n_fft)
+    
+    indexes_A = np.asarray(indexes_A, dtype=int)
+    indexes_B = np.asarray(indexes_B, dtype=int)
+    matrixProfile_AB = np.full(len(profile_AB), np.nan)
+    matrixProfile_AB[indexes_A] = profile_AB[indexes_A]
+    matrixProfile_BA = np.full(len(profile_BA), np.nan)
+    matrixProfile_BA[indexes_B] = profile_BA[indexes_B]
 
     matrixProfile_ABBA = np.concatenate([matrixProfile_AB , matrixProfile_BA])
     return matrixProfile_ABBA
@@ -250,47 +325,373 @@ def calc_MPdist(joinMatrixProfile, dataLength):
     
     threshold = 0.05;
     k = math.ceil(threshold * dataLength)
-    matrixProfile.sort()
     
     if len(matrixProfile) == 0:
-        return np.Inf
-    elif len(matrixProfile) >= k:
-        return matrixProfile[k]
+        return np.inf
+    elif len(matrixProfile) > k:
+        return np.partition(matrixProfile, k)[k]
     else:
-        return matrixProfile[len(matrixProfile) - 1]
+        return np.max(matrixProfile)
+
+def prepare_mpdist_serie(ts, L, n_fft, segments = None):
+    """
+    Precomputes everything an AB-join needs from a single time serie, so it is 
+    computed once per serie instead of once per pair.
+
+    Args:
+        ts (np.ndarray): time serie, Nan or Inf values invalidate the subsequences containing them
+        L (int): window length
+        n_fft (int): length of the FFTs, at least the length of the longest serie to compare
+        segments (np.ndarray, optional): runs of ts without Nan values, see [valid_segments]. Defaults to None.
+
+    Returns:
+        dict: zero-filled serie, its rFFT, rFFT of its first window, sliding mean and std, 
+        and mask of valid subsequences
+    """
+    ts = np.array(ts, dtype=float)
+    isMissing = np.isinf(ts) | np.isnan(ts)
+    ts[isMissing] = 0
+    
+    if segments is None:
+        missing = np.insert(np.cumsum(isMissing), 0, 0)
+        valid = (missing[L:] - missing[:-L]) == 0
+    else:
+        valid = np.zeros(max(len(ts) - L + 1, 0), dtype=bool)
+        for begin, end in segments:
+            valid[begin: end - L + 1] = True
+    
+    s = np.insert(np.cumsum(ts), 0, 0)
+    sSq = np.insert(np.cumsum(ts ** 2), 0, 0)
+    mean = (s[L:] - s[:-L]) / L
+    std = np.sqrt(np.maximum((sSq[L:] - sSq[:-L]) / L - mean ** 2, 0))
+    # * constant subsequences are treated as uncorrelated with every other subsequence
+    std[std == 0] = np.inf
+    
+    return {
+        'ts': ts,
+        'fft': np.fft.rfft(ts, n_fft),
+        'firstFft': np.fft.rfft(ts[:L], n_fft),
+        'mean': mean,
+        'std': std,
+        'valid': valid,
+    }
+
+def _sliding_dot_products(queryFft, serieFft, n_fft, profileLen):
+    # * circular cross correlation, there is no wrap around since n_fft >= len(serie)
+    return np.fft.irfft(np.conj(queryFft) * serieFft, n_fft)[:profileLen]
+
+def prepared_ab_join(A, B, L, n_fft, return_index = False):
+    """
+    Computes the AB and BA matrix profiles of two prepared series with the STOMP 
+    recurrence QT[i, j] = QT[i-1, j-1] - a[i-1]b[j-1] + a[i+L-1]b[j+L-1]. 
+    The first row and column come from the precomputed FFTs.
+
+    Args:
+        A (dict): serie prepared with [prepare_mpdist_serie]
+        B (dict): serie prepared with [prepare_mpdist_serie]
+        L (int): window length
+        n_fft (int): length of the FFTs used to prepare the series
+        return_index (bool, optional): also return the index of the nearest neighbors. Defaults to False.
+
+    Returns:
+        (np.ndarray, np.ndarray): AB and BA matrix profiles, Inf on invalid subsequences, or 
+        (profile_AB, index_AB, profile_BA, index_BA) if return_index, -1 where there is no neighbor
+    """
+    a, b = A['ts'], B['ts']
+    nA = len(A['mean'])
+    nB = len(B['mean'])
+    
+    firstRow = _sliding_dot_products(A['firstFft'], B['fft'], n_fft, nB)
+    firstCol = _sliding_dot_products(B['firstFft'], A['fft'], n_fft, nA)
+    
+    profile_AB = np.full(nA, np.inf)
+    profile_BA = np.full(nB, np.inf)
+    if return_index:
+        index_AB = np.full(nA, -1, dtype=int)
+        index_BA = np.full(nB, -1, dtype=int)
+    
+    invalid_B = ~B['valid']
+    meanB_L = L * B['mean']
+    stdB_L = L * B['std']
+    
+    QT = firstRow.copy()
+    dist = np.empty(nB)
+    for i in range(nA):
+        if i > 0:
+            QT[1:] = QT[:-1] - a[i - 1] * b[:nB - 1] + a[i + L - 1] * b[L:L + nB - 1]
+            QT[0] = firstCol[i]
+        if not A['valid'][i]:
+            continue
+        # * squared z-normalized distance 2L(1 - (QT - L mu_a mu_b) / (L sigma_a sigma_b))
+        np.multiply(meanB_L, A['mean'][i], out=dist)
+        np.subtract(QT, dist, out=dist)
+        np.divide(dist, stdB_L * A['std'][i], out=dist)
+        np.subtract(1, dist, out=dist)
+        np.multiply(dist, 2 * L, out=dist)
+        np.maximum(dist, 0, out=dist)
+        np.sqrt(dist, out=dist)
+        dist[invalid_B] = np.inf
+        
+        if return_index:
+            j = np.argmin(dist)
+            if dist[j] < np.inf:
+                profile_AB[i] = dist[j]
+                index_AB[i] = j
+            update = dist < profile_BA
+            profile_BA[update] = dist[update]
+            index_BA[update] = i
+            continue
+        profile_AB[i] = np.min(dist)
+        np.minimum(profile_BA, dist, out=profile_BA)
+    if return_index:
+        return profile_AB, index_AB, profile_BA, index_BA
+    return profile_AB, profile_BA
+
+def prepared_mp_distance(A, B, L, n_fft):
+    """
+    MPdist between two prepared series, see [prepare_mpdist_serie]
+
+    Returns:
+        float: distance
+    """
+    profile_AB, profile_BA = prepared_ab_join(A, B, L, n_fft)
+    joinMatrixProfile = np.concatenate([profile_AB[A['valid']], profile_BA[B['valid']]])
+    return calc_MPdist(joinMatrixProfile, np.count_nonzero(A['valid']) + np.count_nonzero(B['valid']))
 
-def mp_distance_matrix(mtseries, variables, alphas, L, n_jobs):
+def mp_condensed_distances(series, L, n_jobs = 1):
+    """
+    Condensed MPdist matrix of a list of series. Each serie is prepared once 
+    and the pairs i < j are spread across a process pool, see [pairwise_condensed]
+
+    Args:
+        series (List of np.ndarray): time series
+        L (int): window length
+        n_jobs (int, optional): number of processes, -1 to use all CPU cores. Defaults to 1.
+
+    Returns:
+        np.ndarray: condensed distance matrix, as expected by scipy.spatial.distance.squareform
+    """
+    n_fft = max(len(ts) for ts in series)
+    prepared = [prepare_mpdist_serie(ts, L, n_fft) for ts in series]
+    return pairwise_condensed(prepared, partial(prepared_mp_distance, L=L, n_fft=n_fft), n_jobs=n_jobs)
+
+def mp_distance_matrix(mtseries, variables, alphas, L, n_jobs, condensed = False):
+    """
+    Gets Distance Matrix of multivariate time series using MPdist distance on the selected variables and using the provided alphas
+
+    Args:
+        mtseries (List of MTSerie): Multivariate time series list
+        variables (List of str): Time dependent variables to use
+        alphas (List of float): weigth for each variable
+        L (int): window size
+        n_jobs (int): number of processes, -1 to use all CPU cores
+        condensed (bool, optional): return condensed matrixes. Defaults to False.
+
+    Returns:
+        (np.ndarray, np.ndarray): combined distance matrix and per variable distance matrixes
+    """
     assert len(variables) == len(alphas)
     
     N = len(mtseries)
-    
-    # * assumes all mtseries are even and aligned
     d = len(variables)
-    T = mtseries[0].timeLen
     
-    D_k = np.zeros([d, N, N])
-    
-    values = []
+    D_ks = np.zeros([d, N * (N - 1) // 2])
     for k in range(d):
-        for serie in mtseries:
-            values = values + [serie.get_serie(variables[k])]
-        values =  np.array(values)
-        dm = pairwise_dist(values, L, n_jobs=n_jobs)
-        print(L)
-        print("dm")
-        print(dm)
-        D_k[k] = squareform(dm)
-        
-    D_ks =  np.copy(D_k)
+        D_ks[k] = mp_condensed_distances([serie.get_serie(variables[k]) for serie in mtseries], L, n_jobs=n_jobs)
     
+    D = np.zeros(N * (N - 1) // 2)
     for k in range(d):
-        D_k[k] = np.power(D_k[k], 2) * (alphas[k] ** 2)
-    D = np.sum(D_k, axis=0)
+        D = D + np.power(D_ks[k], 2) * (alphas[k] ** 2)
     D = np.power(D, 1/2)
     
-    return D, D_ks
+    if condensed:
+        return D, D_ks
+    return squareform(D), np.array([squareform(D_k) for D_k in D_ks])
+
+MATRIX_PROFILE_ALGORITHMS = ('stomp', 'scrimp++')
+# * seconds between two checks of the cancel event while waiting for the pool
+CANCEL_POLL_INTERVAL = 0.1
+
+def _serie_matrix_profile(ts, L, algorithm, runtime):
+    if algorithm == 'scrimp++' and 4 <= L <= len(ts) / 2:
+        return scrimp_plus_plus(clean_nan_inf(np.array(ts, dtype=float)), L, runtime=runtime)
+    return mpts.stomp(np.array(ts, dtype=float), L)
+
+def serie_matrix_profile(ts, L, algorithm = 'stomp', runtime = None):
+    """
+    Matrix profile of a time serie with STOMP or SCRIMP++. SCRIMP++ falls back to
+    STOMP when the window is out of its valid range (4 <= L <= len(ts) / 2). 
+    Exact profiles are read from and stored in the on-disk profile cache when enabled
+
+    Args:
+        ts (np.ndarray): time serie
+        L (int): window size
+        algorithm (str, optional): 'stomp' or 'scrimp++'. Defaults to 'stomp'.
+        runtime (int, optional): maximum seconds of SCRIMP++, an approximate profile is 
+            returned when exceeded. Defaults to None.
+
+    Returns:
+        (np.ndarray, np.ndarray): matrix profile and matrix profile index
+    """
+    if algorithm not in MATRIX_PROFILE_ALGORITHMS:
+        raise ValueError("algorithm should be one of {}".format(MATRIX_PROFILE_ALGORITHMS))
+    
+    # * approximate profiles are not cached
+    profileCache = get_profile_cache() if runtime is None else None
+    if profileCache is not None:
+        profile = profileCache.get(ts, L, algorithm)
+        if profile is not None:
+            return profile
+    
+    profile = _serie_matrix_profile(ts, L, algorithm, runtime)
+    if profileCache is not None:
+        profileCache.put(ts, L, algorithm, profile)
+    return profile
+
+def _matrix_profile_job(job, L = None, algorithm = None, runtime = None):
+    i, ts = job
+    return i, _serie_matrix_profile(ts, L, algorithm, runtime)
 
+def matrix_profiles(jobs, L, algorithm = 'stomp', n_jobs = 1, runtime = None, progress = None, cancel = None):
+    """
+    Computes the matrix profiles of many time series, spread across a process pool. 
+    Results are yielded as they are completed, profiles found in the on-disk 
+    profile cache are yielded first
+
+    Args:
+        jobs (List of (key, np.ndarray)): time series to compute, identified by key
+        L (int): window size
+        algorithm (str, optional): 'stomp' or 'scrimp++'. Defaults to 'stomp'.
+        n_jobs (int, optional): number of processes, -1 to use all CPU cores. Defaults to 1.
+        runtime (int, optional): maximum seconds of each SCRIMP++ job. Defaults to None.
+        progress (function, optional): called as progress(done, total) after each job. Defaults to None.
+        cancel (threading.Event, optional): pending jobs are dropped once it is set, running jobs 
+            of the pool are terminated. With n_jobs = 1 the running job is finished first. Defaults to None.
+
+    Yields:
+        (key, (np.ndarray, np.ndarray)): key of the job and its matrix profile and index
+    """
+    if algorithm not in MATRIX_PROFILE_ALGORITHMS:
+        raise ValueError("algorithm should be one of {}".format(MATRIX_PROFILE_ALGORITHMS))
     
+    total = len(jobs)
+    done = 0
+    pending = [(i, ts) for i, (_, ts) in enumerate(jobs)]
     
+    # * approximate profiles are not cached
+    profileCache = get_profile_cache() if runtime is None else None
+    if profileCache is not None:
+        misses = []
+        for i, ts in pending:
+            profile = profileCache.get(ts, L, algorithm)
+            if profile is None:
+                misses.append((i, ts))
+                continue
+            yield jobs[i][0], profile
+            done = done + 1
+            if progress is not None:
+                progress(done, total)
+            if cancel is not None and cancel.is_set():
+                return
+        pending = misses
+    
+    if len(pending) == 0:
+        return
+    
+    func = partial(_matrix_profile_job, L=L, algorithm=algorithm, runtime=runtime)
+    if n_jobs == -1:
+        n_jobs = multiprocessing.cpu_count()
+    
+    if n_jobs == 1:
+        results = map(func, pending)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes=n_jobs)
+        results = pool.imap_unordered(func, pending)
     
-    
\ No newline at end of file
+    if pool is not None and cancel is not None:
+        results = _cancellable(results, cancel)
+    
+    try:
+        for i, profile in results:
+            if profileCache is not None:
+                profileCache.put(jobs[i][1], L, algorithm, profile)
+            yield jobs[i][0], profile
+            done = done + 1
+            if progress is not None:
+                progress(done, total)
+            if cancel is not None and cancel.is_set():
+                break
+    finally:
+        if pool is not None:
+            # * terminate drops the jobs still pending after a cancellation
+            pool.terminate()
+            pool.join()
+
+def _cancellable(results, cancel):
+    """
+    Iterates the results of imap_unordered, checking cancel while waiting for 
+    each one, so a long job does not delay the cancellation
+    """
+    while not cancel.is_set():
+        try:
+            yield results.next(timeout=CANCEL_POLL_INTERVAL)
+        except multiprocessing.TimeoutError:
+            continue
+        except StopIteration:
+            return
+
+def _motifs_job(job, max_motifs = None):
+    key, ts, profile = job
+    return key, motifs(ts, profile, max_motifs)
+
+def series_motifs(jobs, max_motifs = 8, n_jobs = 1):
+    """
+    Top motifs of many time series from their matrix profiles, spread across a process pool
+
+    Args:
+        jobs (List of (key, np.ndarray, (np.ndarray, np.ndarray))): time series and their 
+            matrix profile and index, identified by key
+        max_motifs (int, optional): maximum number of motifs of each serie. Defaults to 8.
+        n_jobs (int, optional): number of processes, -1 to use all CPU cores. Defaults to 1.
+
+    Returns:
+        dict: (motifs, distances) of each key, as returned by motifs
+    """
+    func = partial(_motifs_job, max_motifs=max_motifs)
+    if n_jobs == -1:
+        n_jobs = multiprocessing.cpu_count()
+    
+    if n_jobs == 1:
+        results = [func(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(processes=n_jobs) as pool:
+            results = pool.map(func, jobs)
+    return dict(results)
+
+def _pan_matrix_profile_job(job, windows = None):
+    key, ts = job
+    return key, pan_matrix_profile(ts, windows)
+
+def pan_matrix_profiles(jobs, windows, n_jobs = 1):
+    """
+    Pan matrix profiles of many time series, spread across a process pool
+
+    Args:
+        jobs (List of (key, np.ndarray)): time series identified by key
+        windows (List of int): window sizes
+        n_jobs (int, optional): number of processes, -1 to use all CPU cores. Defaults to 1.
+
+    Returns:
+        dict: [PanMatrixProfile] of each key
+    """
+    func = partial(_pan_matrix_profile_job, windows=list(windows))
+    if n_jobs == -1:
+        n_jobs = multiprocessing.cpu_count()
+    
+    if n_jobs == 1:
+        results = [func(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(processes=n_jobs) as pool:
+            results = pool.map(func, jobs)
+    return dict(results)
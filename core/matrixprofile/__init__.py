@@ -1,2 +1,2 @@
 name = "matrixprofile"
-__all__ = ['utils', 'order', 'distanceProfile', 'matrixProfile', 'fluss', 'regimes', 'motifs', 'annotation_vector']
+__all__ = ['utils', 'order', 'distanceProfile', 'matrixProfile', 'fluss', 'regimes', 'motifs', 'annotation_vector', 'scrimp', 'mstamp', 'streaming', 'backend', 'pmp']
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""
+Optional Numba backend for the diagonal traversal kernels of SCRIMP++ and the
+STOMP loop. The pure NumPy implementations remain the fallback when Numba is
+not installed or when the 'numpy' backend is selected.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+range = getattr(__builtins__, 'xrange', range)
+# end of py2 compatability boilerplate
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BACKENDS = ('numpy', 'numba')
+
+_backend = 'numba' if numba is not None else 'numpy'
+
+
+def set_backend(name):
+    """
+    Selects the backend used by the matrix profile algorithms.
+
+    Parameters
+    ----------
+    name: 'numpy', 'numba' or 'auto'. 'auto' selects numba when it is installed.
+    """
+    global _backend
+
+    if name == 'auto':
+        name = 'numba' if numba is not None else 'numpy'
+
+    if name not in BACKENDS:
+        raise ValueError('backend should be one of {}'.format(BACKENDS + ('auto',)))
+
+    if name == 'numba' and numba is None:
+        raise ValueError('numba backend selected but numba is not installed')
+
+    _backend = name
+
+
+def get_backend():
+    """
+    Returns the name of the selected backend.
+    """
+    return _backend
+
+
+def use_numba():
+    return _backend == 'numba'
+
+
+if numba is not None:
+
+    @numba.njit(cache=True, error_model='numpy')
+    def calc_curlastz(ts, m, n, idx, profile_len, curlastz):
+        total = 0.0
+        for k in range(m):
+            total += ts[k] * ts[idx + k]
+        curlastz[idx] = total
+
+        for k in range(profile_len - idx - 1):
+            total += ts[m + k] * ts[idx + m + k] - ts[k] * ts[idx + k]
+            curlastz[idx + 1 + k] = total
+
+        return curlastz
+
+    @numba.njit(cache=True, error_model='numpy')
+    def calc_dotproduct_begin_idx(ts, dp, beginidx, idx, idx_diff, m, idx_nn):
+        total = dp[idx]
+        for pos in range(idx - 1, beginidx - 1, -1):
+            nn = pos + idx_diff
+            total += ts[pos] * ts[nn] - ts[pos + m] * ts[nn + m]
+            dp[pos] = total
+
+        return dp
+
+    @numba.njit(cache=True, error_model='numpy')
+    def apply_update_positions(matrix_profile, mp_index, refine_distance,
+                               beginidx, endidx, orig_index, idx_diff):
+        for pos in range(beginidx, endidx + 1):
+            if refine_distance[pos] < matrix_profile[pos]:
+                matrix_profile[pos] = refine_distance[pos]
+                mp_index[pos] = orig_index[pos] + idx_diff
+
+        for pos in range(beginidx, endidx + 1):
+            if refine_distance[pos] < matrix_profile[pos + idx_diff]:
+                matrix_profile[pos + idx_diff] = refine_distance[pos]
+                mp_index[pos + idx_diff] = orig_index[pos]
+
+        return (matrix_profile, mp_index)
+
+    @numba.njit(cache=True, error_model='numpy')
+    def stomp_loop(tsA, tsB, m, meanA, stdA, meanB, stdB, dot, dot_first, distanceProfile,
+                   mp, mpIndex, selfJoin, exclusionBefore, exclusionAfter, constantA, constantB):
+        """
+        Runs every STOMP step, distanceProfile and dot must hold the values of
+        the first step (idx = 0), dot_first[idx] is the dot product of the first
+        subsequence of tsB with the query idx of tsA. constantA and constantB
+        flag the constant subsequences, which are never matched.
+        """
+        n = len(tsB)
+        l = n - m + 1
+        profileLen = len(tsA) - m + 1
+
+        for idx in range(profileLen):
+            if idx > 0:
+                for j in range(l - 1, 0, -1):
+                    dot[j] = dot[j - 1] + (tsA[idx + m - 1] * tsB[m - 1 + j] - tsA[idx - 1] * tsB[j - 1])
+                dot[0] = dot_first[idx]
+
+                for j in range(l):
+                    if constantA[idx] or constantB[j]:
+                        distanceProfile[j] = np.inf
+                        continue
+                    res = 2 * m * (1 - (dot[j] - m * meanA[idx] * meanB[j]) / (m * stdA[idx] * stdB[j]))
+                    if res > 0:
+                        distanceProfile[j] = np.sqrt(res)
+                    elif res <= 0:
+                        distanceProfile[j] = 0.0
+                    else:
+                        distanceProfile[j] = res
+
+            if selfJoin:
+                start = int(max(0, idx - exclusionBefore))
+                # the slice of the numpy kernel is clamped to the profile length
+                stop = int(min(idx + exclusionAfter, n, l))
+                for j in range(start, stop):
+                    distanceProfile[j] = np.inf
+
+            # same semantics as np.minimum, Nan values are propagated
+            for j in range(l):
+                if distanceProfile[j] < mp[j]:
+                    mpIndex[j] = idx
+                    mp[j] = distanceProfile[j]
+                elif distanceProfile[j] != distanceProfile[j]:
+                    mp[j] = distanceProfile[j]
+
+        return (mp, mpIndex)
@@ -26,17 +26,17 @@ def discords(mp,ex_zone,k=3):
     """
     k = len(mp) if k > len(mp) else k
 
-    mp_current = np.copy(mp)
+    #Only finite and positive values can be discords, excluded positions become -inf
+    mp_current = np.where(np.isfinite(mp) & (np.asarray(mp) > 0), mp, -np.inf)
     d = np.zeros(k, dtype='int')
     for i in range(k):
-        maxVal = 0
-        maxIdx = sys.maxsize
-        for j, val in enumerate(mp_current):
-            if not np.isinf(val) and val > maxVal:
-                maxVal = val
-                maxIdx = j
+        maxIdx = int(np.argmax(mp_current)) if len(mp_current) > 0 else 0
+        if len(mp_current) == 0 or mp_current[maxIdx] == -np.inf:
+            #No more discords, the remaining ones are MaxInt
+            d[i:] = sys.maxsize
+            break
 
         d[i] = maxIdx
-        mp_current[max([maxIdx-ex_zone, 0]):min([maxIdx+ex_zone, len(mp_current)])] = np.inf
+        mp_current[max([maxIdx-ex_zone, 0]):min([maxIdx+ex_zone, len(mp_current)])] = -np.inf
 
     return d
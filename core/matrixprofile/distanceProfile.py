@@ -63,7 +63,8 @@ def massDistanceProfile(tsA,idx,m,tsB = None):
 
     query = tsA[idx:(idx+m)]
     n = len(tsB)
-    distanceProfile = np.real(np.sqrt(mass(query,tsB).astype(complex)))
+    #tsB is prepared once and reused by the following queries against the same series
+    distanceProfile = np.real(np.sqrt(prepare_series(tsB).mass(query).astype(complex)))
     if selfJoin:
         trivialMatchRange = (int(max(0,idx - np.round(m/2,0))),int(min(idx + np.round(m/2+1,0),n)))
         distanceProfile[trivialMatchRange[0]:trivialMatchRange[1]] = np.inf
@@ -125,6 +126,11 @@ def STOMPDistanceProfile(tsA,idx,m,tsB,dot_first,dp,mean,std):
         res, dot = massStomp(query,tsB,dot_first,dp,idx,mean,std)
         distanceProfile = np.real(np.sqrt(res.astype(complex)))
 
+    #Distances to constant subsequences are 0/0, they are never matched
+    if np.all(query == query[0]):
+        distanceProfile[:] = np.inf
+    else:
+        distanceProfile[movconstant(tsB,m)] = np.inf
 
     if selfJoin:
         trivialMatchRange = (int(max(0,idx - np.round(m/2,0))),int(min(idx + np.round(m/2+1,0),n)))
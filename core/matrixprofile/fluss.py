@@ -9,6 +9,9 @@ range = getattr(__builtins__, 'xrange', range)
 
 import numpy as np
 
+from .streaming import StreamingMatrixProfile
+from .regimes import extract_regimes
+
 def _idealized_arc_curve(n, x):
     """
     Returns the value at x for the parabola of width n and height n / 2.
@@ -43,18 +46,16 @@ def fluss(mpi, m=None):
     nnmark = np.zeros(n)
 
     # find the number of additional arcs starting to cross over each index
-    for i in range(0, n):
-        mpi_val = mpi[i]
-        small = int(min(i, mpi_val))
-        large = int(max(i, mpi_val))
-        nnmark[small + 1] = nnmark[small + 1] + 1
-        nnmark[large] = nnmark[large] - 1
+    indexes = np.arange(n)
+    mpi = np.asarray(mpi).astype(int)
+    np.add.at(nnmark, np.minimum(indexes, mpi) + 1, 1)
+    np.add.at(nnmark, np.maximum(indexes, mpi), -1)
 
     # cumulatively sum all crossing arcs at each index
     cross_count = np.cumsum(nnmark)
 
     # compute ideal arc curve for all indices
-    idealized = np.apply_along_axis(lambda i: _idealized_arc_curve(n, i), 0, np.arange(0, n))
+    idealized = _idealized_arc_curve(n, indexes)
     idealized = cross_count / idealized
 
     # correct the arc curve so that it is between 0 and 1
@@ -68,6 +69,130 @@ def fluss(mpi, m=None):
     return corrected_arc_curve
 
 
+def _idealized_left_arc_curve(n):
+    """
+    Returns the expected number of arcs crossing each index when every
+    subsequence i points to a uniformly random subsequence before it. The arc
+    of i crosses x when it starts before x and i > x, so the expected value is
+    x * (H(n-1) - H(x)), with H the harmonic numbers.
+
+    Parameters
+    ----------
+    n: Number of subsequences.
+    """
+    harmonic = np.concatenate([[0], np.cumsum(1 / np.arange(1, n))])
+    x = np.arange(n)
+    return x * (harmonic[n - 1] - harmonic[x])
+
+
+class FLOSS(object):
+    """
+    Fast Low-cost Online Semantic Segmentation. The corrected arc curve of a
+    stream is maintained from the left matrix profile index: the arc of a new
+    subsequence is final when it arrives, and the arcs pointing to values that
+    age out of the horizon are removed.
+
+    Parameters
+    ----------
+    m: Subsequence length.
+    horizon: Maximum number of values kept, None keeps the whole stream.
+    """
+    def __init__(self, m, horizon=None):
+        self.m = m
+        self.stream = StreamingMatrixProfile(m, horizon=horizon)
+        size = 2 * horizon if horizon is not None else 1024
+        #Arc start and crossing count of the subsequence at stream position _base + i
+        self._arcs = np.full(size, -1, dtype=int)
+        self._cross = np.zeros(size)
+        self._base = 0
+
+    def _relative(self, position):
+        return position - self._base
+
+    def _make_room(self):
+        #Keep only the positions still in the window
+        first = self._relative(self.stream.offset)
+        length = len(self._arcs) - first
+        if length > len(self._arcs) // 2:
+            arcs = np.full(2 * len(self._arcs), -1, dtype=int)
+            cross = np.zeros(2 * len(self._cross))
+        else:
+            arcs = self._arcs
+            cross = self._cross
+        arcs[:length] = self._arcs[first:]
+        cross[:length] = self._cross[first:]
+        arcs[length:] = -1
+        cross[length:] = 0
+        self._arcs = arcs
+        self._cross = cross
+        self._base = self.stream.offset
+
+    def append(self, value):
+        """
+        Adds a new value to the stream and updates the arc curve.
+        """
+        offset = self.stream.offset
+        position = self.stream.append(value)
+
+        # remove the arcs pointing to the subsequences that aged out
+        for dropped in range(offset, self.stream.offset):
+            first = self._relative(dropped) + 1
+            if position is None:
+                break
+            arcs = self._arcs[first:self._relative(position)]
+            for i in np.flatnonzero(arcs == dropped):
+                self._cross[first:first + i] -= 1
+                arcs[i] = -1
+
+        if position is None:
+            return
+
+        if self._relative(position) >= len(self._arcs):
+            self._make_room()
+
+        i = self._relative(position)
+        self._cross[i] = 0
+        self._arcs[i] = -1
+        _, j = self.stream.left_neighbor(position)
+        if j >= 0:
+            self._arcs[i] = j
+            self._cross[self._relative(j) + 1:i] += 1
+
+    def extend(self, values):
+        """
+        Adds several values to the stream, in order.
+        """
+        for value in values:
+            self.append(value)
+
+    @property
+    def offset(self):
+        """Stream position of the first subsequence of the arc curve."""
+        return self.stream.offset
+
+    @property
+    def cac(self):
+        """Corrected arc curve of the subsequences in the window."""
+        n = max(0, len(self.stream.values) - self.m + 1)
+        first = self._relative(self.stream.offset)
+        cross_count = self._cross[first:first + n]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corrected_arc_curve = cross_count / _idealized_left_arc_curve(n)
+        corrected_arc_curve[~(corrected_arc_curve <= 1)] = 1
+
+        corrected_arc_curve[:self.m] = 1
+        corrected_arc_curve[-self.m:] = 1
+
+        return corrected_arc_curve
+
+    def regimes(self, num=3):
+        """
+        Stream positions of the regime changes found in the live arc curve.
+        """
+        return extract_regimes(self.cac, self.m, num) + self.offset
+
+
 if __name__ == "__main__":
     import doctest
     doctest.method()
@@ -9,9 +9,11 @@ range = getattr(__builtins__, 'xrange', range)
 
 from . import distanceProfile
 from . import order
-from .utils import mass, movmeanstd
+from . import backend
+from .utils import mass, movmeanstd, movconstant, slidingDotProduct, is_self_join
 import numpy as np
 import multiprocessing
+from multiprocessing import shared_memory
 from functools import partial
 import math
 
@@ -125,9 +127,148 @@ def _matrixProfile(tsA,m,orderClass,distanceProfileFunction,tsB=None):
 
     return (mp,mpIndex)
 
+def _share_array(a):
+    """
+    Copies an array into a new shared memory block. The caller must close and unlink it.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+    np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)[:] = a
+    return shm
+
+def _init_shared_worker(names, lengths):
+    """
+    Attaches a pool worker to the shared memory blocks holding tsA and tsB.
+    """
+    global _workerShm, _workerSeries
+    _workerShm = [shared_memory.SharedMemory(name=name) for name in names]
+    _workerSeries = [np.ndarray((n,), dtype=np.float64, buffer=shm.buf) for shm, n in zip(_workerShm, lengths)]
+    if len(_workerSeries) == 1:
+        _workerSeries = _workerSeries * 2
+
+def _stamp_rows(indices, m=None, selfJoin=None):
+    """
+    Reduces the distance profiles of the given indices to a local (profile, index) pair.
+    """
+    tsA, tsB = _workerSeries
+    mp, mpIndex = _self_join_or_not_preprocess(tsA, tsB, m)
+
+    for idx in indices:
+        (dp,querySegmentsID) = distanceProfile.massDistanceProfile(tsA, idx, m, None if selfJoin else tsB)
+
+        idsToUpdate = dp < mp
+        mpIndex[idsToUpdate] = querySegmentsID[idsToUpdate]
+        mp = np.minimum(mp, dp)
+
+    return (mp, mpIndex)
+
+def _stomp_rows(rows, m=None, selfJoin=None):
+    """
+    Runs the STOMP recurrence over the contiguous range of queries rows = (start, stop) of tsA
+    and reduces it to a local (profile, index) pair. The first dot product of the range is
+    computed via FFT, so ranges are independent of each other.
+    """
+    start, stop = rows
+    tsA, tsB = _workerSeries
+    mp, mpIndex = _self_join_or_not_preprocess(tsA, tsB, m)
+
+    n = len(tsB)
+    l = n-m+1
+
+    meanA, stdA = movmeanstd(tsA,m)
+    meanB, stdB = movmeanstd(tsB,m)
+    constantA = movconstant(tsA,m)
+    constantB = movconstant(tsB,m)
+
+    #dot_first[idx] is the dot product of the first subsequence of tsB with the query idx
+    dot_first = slidingDotProduct(tsB[0:m],tsA)
+    dot = slidingDotProduct(tsA[start:start+m],tsB)
+
+    distanceProfile = np.empty(l)
+    update = np.empty(l-1)
+    update_b = np.empty(l-1)
+    denominator = np.empty(l)
+    idsToUpdate = np.empty(l, dtype=bool)
+
+    for idx in range(start, stop):
+        if idx > start:
+            np.multiply(tsA[idx+m-1],tsB[m:n],out=update)
+            np.multiply(tsA[idx-1],tsB[:l-1],out=update_b)
+            np.subtract(update,update_b,out=update)
+            dot[1:] = dot[:-1]
+            np.add(dot[1:],update,out=dot[1:])
+            dot[0] = dot_first[idx]
+
+        #res = 2*m*(1-(dot-m*meanA[idx]*meanB)/(m*stdA[idx]*stdB))
+        np.multiply(m*meanA[idx],meanB,out=distanceProfile)
+        np.subtract(dot,distanceProfile,out=distanceProfile)
+        np.multiply(m*stdA[idx],stdB,out=denominator)
+        np.divide(distanceProfile,denominator,out=distanceProfile)
+        np.subtract(1,distanceProfile,out=distanceProfile)
+        np.multiply(2*m,distanceProfile,out=distanceProfile)
+        np.maximum(distanceProfile,0,out=distanceProfile)
+        np.sqrt(distanceProfile,out=distanceProfile)
+
+        #Constant subsequences are never matched, as in the serial kernel
+        if constantA[idx]:
+            distanceProfile[:] = np.inf
+        else:
+            np.copyto(distanceProfile,np.inf,where=constantB)
+
+        if selfJoin:
+            trivialMatchRange = (int(max(0,idx - np.round(m/2,0))),int(min(idx + np.round(m/2+1,0),n)))
+            distanceProfile[trivialMatchRange[0]:trivialMatchRange[1]] = np.inf
+
+        np.less(distanceProfile,mp,out=idsToUpdate)
+        np.copyto(mpIndex,idx,where=idsToUpdate)
+        np.minimum(mp,distanceProfile,out=mp)
+
+    return (mp, mpIndex)
+
+def _parallel_matrixProfile(tsA, m, tsB, rowsFunction, chunks, n_threads):
+    """
+    Shares tsA and tsB with a pool of workers through shared memory. Each worker reduces its
+    chunk of queries to a local (profile, index) pair with rowsFunction, so the parent only
+    merges n_threads profiles with an elementwise minimum.
+
+    Parameters
+    ----------
+    tsA: Cleaned time series containing the queries.
+    m: Length of subsequence to compare.
+    tsB: Cleaned time series to compare the queries against, None for a self join.
+    rowsFunction: Worker function called as rowsFunction(chunk, m=m, selfJoin=selfJoin).
+    chunks: Work item of each worker.
+    n_threads: Number of processes.
+    """
+    selfJoin = tsB is None
+    series = [tsA] if selfJoin else [tsA, tsB]
+    shms = [_share_array(np.ascontiguousarray(ts, dtype=np.float64)) for ts in series]
+
+    try:
+        with multiprocessing.Pool(processes=n_threads, initializer=_init_shared_worker,
+                                  initargs=([shm.name for shm in shms], [len(ts) for ts in series])) as pool:
+            func = partial(rowsFunction, m=m, selfJoin=selfJoin)
+            results = pool.map(func, chunks)
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    mp, mpIndex = _self_join_or_not_preprocess(tsA, tsB, m)
+
+    # The overall matrix profile is the element-wise minimum of each sub-profile. Chunks are merged
+    # in order and only strictly smaller distances are taken, so ties keep the earliest query.
+    for localMp, localMpIndex in results:
+        idsToUpdate = localMp < mp
+        mpIndex[idsToUpdate] = localMpIndex[idsToUpdate]
+        mp = np.minimum(mp, localMp)
+
+    return (mp, mpIndex)
+
 def _stamp_parallel(tsA, m, tsB=None, sampling=0.2, n_threads=-1, random_state=None):
     """
-    Computes distance profiles in parallel using all CPU cores by default.
+    Computes distance profiles in parallel using all CPU cores by default. The series are
+    shared with the workers through shared memory and each worker returns a single
+    (profile, index) pair.
 
     Parameters
     ----------
@@ -138,17 +279,16 @@ def _stamp_parallel(tsA, m, tsB=None, sampling=0.2, n_threads=-1, random_state=N
     n_threads: Number of threads to use in parallel mode. Defaults to using all CPU cores.
     random_state: Set the random seed generator for reproducible results.
     """
-    if n_threads is -1:
+    if n_threads == -1:
         n_threads = multiprocessing.cpu_count()
 
     n = len(tsA)
-    mp, mpIndex = _self_join_or_not_preprocess(tsA, tsB, m)
-
-    if not is_array_like(tsB):
-        tsB = tsA
 
     tsA = _clean_nan_inf(tsA)
-    tsB = _clean_nan_inf(tsB)
+    if is_array_like(tsB):
+        tsB = _clean_nan_inf(tsB)
+    if is_self_join(tsA, tsB):
+        tsB = None
 
     # determine sampling size
     sample_size = math.ceil((n - m + 1) * sampling)
@@ -161,25 +301,7 @@ def _stamp_parallel(tsA, m, tsB=None, sampling=0.2, n_threads=-1, random_state=N
     indices = np.random.choice(indices, size=sample_size, replace=False)
     indices = np.array_split(indices, n_threads)
 
-    # create pool of workers and compute
-    with multiprocessing.Pool(processes=n_threads) as pool:
-        func = partial(distanceProfile.mass_distance_profile_parallel, tsA=tsA, tsB=tsB, m=m)
-        results = pool.map(func, indices)
-
-    # The overall matrix profile is the element-wise minimum of each sub-profile, and each element of the overall
-    # matrix profile index is the time series position of the corresponding sub-profile.
-    for result in results:
-        for dp, querySegmentsID in result:
-            #Check which of the indices have found a new minimum
-            idsToUpdate = dp < mp
-
-            #Update the Matrix Profile Index to indicate that the current index is the minimum location for the aforementioned indices
-            mpIndex[idsToUpdate] = querySegmentsID[idsToUpdate]
-
-            #Update the matrix profile to include the new minimum values (where appropriate)
-            mp = np.minimum(mp, dp)
-
-    return (mp, mpIndex)
+    return _parallel_matrixProfile(tsA, m, tsB, _stamp_rows, indices, n_threads)
 
 def _matrixProfile_sampling(tsA,m,orderClass,distanceProfileFunction,tsB=None,sampling=0.2,random_state=None):
     order = orderClass(len(tsA)-m+1, random_state=random_state)
@@ -258,8 +380,134 @@ def _matrixProfile_stomp(tsA,m,orderClass,distanceProfileFunction,tsB=None):
         dp = dot_prev
     return (mp,mpIndex)
 
+def _matrixProfile_stomp_inplace(tsA,m,tsB=None):
+    """
+    STOMP kernel working on preallocated buffers. The sliding dot product is shifted and
+    updated in place, and the distance profile, exclusion zone and minimum update are
+    written into reused arrays. The floating point operations are the same ones done by
+    _matrixProfile_stomp with STOMPDistanceProfile, so the results are identical.
+
+    Parameters
+    ----------
+    tsA: Time series containing the queries for which to calculate the Matrix Profile.
+    m: Length of subsequence to compare.
+    tsB: Time series to compare the query against. Note that, if no value is provided, tsB = tsA by default.
+    """
+    mp, mpIndex = _self_join_or_not_preprocess(tsA, tsB, m)
+
+    if not is_array_like(tsB):
+        tsB = tsA
+
+    tsA = _clean_nan_inf(tsA)
+    tsB = _clean_nan_inf(tsB)
+
+    selfJoin = is_self_join(tsA, tsB)
+    if selfJoin:
+        tsB = tsA
+
+    n = len(tsB)
+    l = n-m+1
+    profileLen = len(tsA)-m+1
+
+    #Get moving mean and standard deviation
+    meanA, stdA = movmeanstd(tsA,m)
+    meanB, stdB = (meanA, stdA) if selfJoin else movmeanstd(tsB,m)
+
+    #Distances to constant subsequences are 0/0 and depend on the rounding of the dot
+    #product, constant subsequences are never matched instead
+    constantA = movconstant(tsA,m)
+    constantB = constantA if selfJoin else movconstant(tsB,m)
+
+    #The first distance profile and dot product are computed via MASS
+    query = tsA[0:m]
+    distanceProfile = np.real(np.sqrt(mass(query,tsB).astype(complex)))
+    if constantA[0]:
+        distanceProfile[:] = np.inf
+    else:
+        distanceProfile[constantB] = np.inf
+    dot = slidingDotProduct(query,tsB)
+
+    #dot_first[idx] is the dot product of the first subsequence of tsB with the query idx
+    dot_first = np.copy(dot) if selfJoin else slidingDotProduct(tsB[0:m],tsA)
+
+    if backend.use_numba():
+        return backend.stomp_loop(tsA, tsB, m, meanA, stdA, meanB, stdB, dot, dot_first,
+                                  np.ascontiguousarray(distanceProfile), mp, mpIndex, selfJoin,
+                                  np.round(m/2,0), np.round(m/2+1,0), constantA, constantB)
+
+    update = np.empty(l-1)
+    update_b = np.empty(l-1)
+    denominator = np.empty(l)
+    idsToUpdate = np.empty(l, dtype=bool)
+
+    for idx in range(profileLen):
+        if idx > 0:
+            #dot[j] = dot_prev[j-1] + (tsA[idx+m-1]*tsB[m-1+j] - tsA[idx-1]*tsB[j-1])
+            np.multiply(tsA[idx+m-1],tsB[m:n],out=update)
+            np.multiply(tsA[idx-1],tsB[:l-1],out=update_b)
+            np.subtract(update,update_b,out=update)
+            dot[1:] = dot[:-1]
+            np.add(dot[1:],update,out=dot[1:])
+            dot[0] = dot_first[idx]
+
+            #res = 2*m*(1-(dot-m*meanA[idx]*meanB)/(m*stdA[idx]*stdB))
+            np.multiply(m*meanA[idx],meanB,out=distanceProfile)
+            np.subtract(dot,distanceProfile,out=distanceProfile)
+            np.multiply(m*stdA[idx],stdB,out=denominator)
+            np.divide(distanceProfile,denominator,out=distanceProfile)
+            np.subtract(1,distanceProfile,out=distanceProfile)
+            np.multiply(2*m,distanceProfile,out=distanceProfile)
+
+            #Real part of the complex square root, negative values become zero
+            np.maximum(distanceProfile,0,out=distanceProfile)
+            np.sqrt(distanceProfile,out=distanceProfile)
+
+            if constantA[idx]:
+                distanceProfile[:] = np.inf
+            else:
+                np.copyto(distanceProfile,np.inf,where=constantB)
+
+        if selfJoin:
+            trivialMatchRange = (int(max(0,idx - np.round(m/2,0))),int(min(idx + np.round(m/2+1,0),n)))
+            distanceProfile[trivialMatchRange[0]:trivialMatchRange[1]] = np.inf
+
+        #Update the Matrix Profile and its index where a new minimum was found
+        np.less(distanceProfile,mp,out=idsToUpdate)
+        np.copyto(mpIndex,idx,where=idsToUpdate)
+        np.minimum(mp,distanceProfile,out=mp)
+
+    return (mp,mpIndex)
+
+def _stomp_parallel(tsA, m, tsB=None, n_threads=-1):
+    """
+    Computes the STOMP Matrix Profile in parallel. The queries of tsA are split into
+    contiguous ranges, each worker runs the STOMP recurrence over its range on the
+    shared series and returns a single (profile, index) pair.
+
+    Parameters
+    ----------
+    tsA: Time series containing the queries for which to calculate the Matrix Profile.
+    m: Length of subsequence to compare.
+    tsB: Time series to compare the query against. Note that, if no value is provided, tsB = tsA by default.
+    n_threads: Number of threads to use in parallel mode. Defaults to using all CPU cores.
+    """
+    if n_threads == -1:
+        n_threads = multiprocessing.cpu_count()
+
+    tsA = _clean_nan_inf(tsA)
+    if is_array_like(tsB):
+        tsB = _clean_nan_inf(tsB)
+    if is_self_join(tsA, tsB):
+        tsB = None
+
+    profileLen = len(tsA)-m+1
+    n_threads = max(1, min(n_threads, profileLen))
+    rows = [(chunk[0], chunk[-1] + 1) for chunk in np.array_split(np.arange(profileLen), n_threads)]
+
+    return _parallel_matrixProfile(tsA, m, tsB, _stomp_rows, rows, n_threads)
+
 def stampi_update(tsA,m,mp,mpIndex,newval,tsB=None,distanceProfileFunction=distanceProfile.massDistanceProfile):
-    '''Updates the self-matched matrix profile for a time series TsA with the arrival of a new data point newval. Note that comparison of two separate time-series with new data arriving will be built later -> currently, tsB should be set to tsA'''
+    '''Updates the self-matched matrix profile for a time series TsA with the arrival of a new data point newval. Note that comparison of two separate time-series with new data arriving will be built later -> currently, tsB should be set to tsA. For streams, streaming.StreamingMatrixProfile avoids copying the series and profiles on every arrival'''
 
     #Update time-series array with recent value
     tsA_new = np.append(np.copy(tsA),newval)
@@ -334,7 +582,7 @@ def stamp(tsA,m,tsB=None,sampling=0.2, n_threads=None, random_state=None):
 
     return _stamp_parallel(tsA, m, tsB=tsB, sampling=sampling, n_threads=n_threads, random_state=random_state)
 
-def stomp(tsA,m,tsB=None):
+def stomp(tsA,m,tsB=None,n_threads=None):
     """
     Calculate the Matrix Profile using the more efficient MASS calculation. Distance profiles are computed according to the directed STOMP procedure.
 
@@ -343,8 +591,12 @@ def stomp(tsA,m,tsB=None):
     tsA: Time series containing the queries for which to calculate the Matrix Profile.
     m: Length of subsequence to compare.
     tsB: Time series to compare the query against. Note that, if no value is provided, tsB = tsA by default.
+    n_threads: Number of threads to use in parallel mode. Defaults to single threaded mode. Set to -1 to use all threads.
     """
-    return _matrixProfile_stomp(tsA,m,order.linearOrder,distanceProfile.STOMPDistanceProfile,tsB)
+    if n_threads is None:
+        return _matrixProfile_stomp_inplace(tsA,m,tsB)
+
+    return _stomp_parallel(tsA, m, tsB=tsB, n_threads=n_threads)
 
 
 
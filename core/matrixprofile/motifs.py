@@ -45,6 +45,9 @@ def motifs(ts, mp, max_motifs=3, radius=2, n_neighbors=None, ex_zone=None):
     if ex_zone is None:
         ex_zone = m / 2
 
+    # cumulative exclusion zones of the motifs found so far
+    motifs_mask = np.zeros(len(mp_current), dtype=bool)
+
     for j in range(max_motifs):
         # find minimum distance and index location
         min_idx = mp_current.argmin()
@@ -62,6 +65,7 @@ def motifs(ts, mp, max_motifs=3, radius=2, n_neighbors=None, ex_zone=None):
 
         motif_set = set(initial_motif)
 
+        # the FFT of the series is prepared once and shared by the distance profiles of every motif
         prof, _ = distanceProfile.massDistanceProfile(ts, initial_motif[0], m)
 
         # kill off any indices around the initial motif pair since they are
@@ -69,26 +73,23 @@ def motifs(ts, mp, max_motifs=3, radius=2, n_neighbors=None, ex_zone=None):
         for idx in initial_motif:
             _applyExclusionZone(prof, idx, ex_zone)
         # exclude previous motifs
-        for ms in motifs:
-            for idx in ms:
-                _applyExclusionZone(prof, idx, ex_zone)
+        prof[motifs_mask] = np.inf
 
         # keep looking for the closest index to the current motif. Each
         # index found will have an exclusion zone applied as to remove
         # trivial solutions. This eventually exits when there's nothing
-        # found within the radius distance.
-        prof_idx_sort = prof.argsort()
+        # found within the radius distance, so only the indices below it
+        # are sorted.
+        candidates = np.flatnonzero(prof < motif_distance * radius)
+        prof_idx_sort = candidates[np.argsort(prof[candidates], kind='stable')]
 
         for nn_idx in prof_idx_sort:
             if n_neighbors is not None and len(motif_set) >= n_neighbors:
                 break
             if prof[nn_idx] == np.inf:
                 continue
-            if prof[nn_idx] < motif_distance * radius:
-                motif_set.add(nn_idx)
-                _applyExclusionZone(prof, nn_idx, ex_zone)
-            else:
-                break
+            motif_set.add(nn_idx)
+            _applyExclusionZone(prof, nn_idx, ex_zone)
 
         for motif in motif_set:
             _applyExclusionZone(mp_current, motif, ex_zone)
@@ -97,6 +98,8 @@ def motifs(ts, mp, max_motifs=3, radius=2, n_neighbors=None, ex_zone=None):
             continue
         motifs += [list(sorted(motif_set))]
         distances += [motif_distance]
+        for motif in motif_set:
+            motifs_mask[int(max(0, motif - ex_zone)):int(motif + ex_zone + 1)] = True
 
     return motifs, distances
 
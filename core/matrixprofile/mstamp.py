@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""
+Multidimensional matrix profile (mSTAMP) computed with the STOMP ordering, the
+dot products of every dimension are updated together at each step.
+
+Matrix Profile VI: Meaningful Multidimensional Motif Discovery. Chin-Chia
+Michael Yeh, Nickolas Kavantzas, Eamonn Keogh, ICDM 2017.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+range = getattr(__builtins__, 'xrange', range)
+# end of py2 compatability boilerplate
+
+import numpy as np
+
+from .utils import movmeanstd, movconstant, slidingDotProduct
+
+
+def mstomp(ts, m):
+    """
+    Computes the k-dimensional matrix profiles of a multidimensional time series
+    for every k. At each step the distance profiles of all the dimensions are
+    sorted, so the k-dimensional distance of a pair of subsequences is the mean
+    of its k smallest squared distances.
+
+    Parameters
+    ----------
+    ts: 2-D array with one dimension per row.
+    m: Length of subsequence to compare.
+
+    Returns tuple (mp, mpIndex)
+    mp: (d, n-m+1) array, row k-1 is the k-dimensional matrix profile.
+    mpIndex: (d, n-m+1) array with the matrix profile index of each row.
+    """
+    ts = np.atleast_2d(np.array(ts, dtype=float))
+    ts[~np.isfinite(ts)] = 0
+    d, n = ts.shape
+    l = n-m+1
+
+    if l < 1:
+        raise ValueError('Time series is shorter than the subsequence length')
+
+    mean = np.empty((d, l))
+    std = np.empty((d, l))
+    dot_first = np.empty((d, l))
+    constant = np.empty((d, l), dtype=bool)
+    for k in range(d):
+        mean[k], std[k] = movmeanstd(ts[k], m)
+        constant[k] = movconstant(ts[k], m)
+        dot_first[k] = slidingDotProduct(ts[k, 0:m], ts[k])
+
+    dot = np.copy(dot_first)
+    mp = np.full((d, l), np.inf)
+    mpIndex = np.zeros((d, l), dtype=int)
+    counts = np.arange(1, d+1)[:, np.newaxis]
+
+    #Buffers reused at every step, as in the in-place STOMP kernel
+    update = np.empty((d, l-1))
+    update_b = np.empty((d, l-1))
+    distanceProfile = np.empty((d, l))
+    denominator = np.empty((d, l))
+    idsToUpdate = np.empty((d, l), dtype=bool)
+
+    for idx in range(l):
+        if idx > 0:
+            #dot[k, j] = dot_prev[k, j-1] + (ts[k, idx+m-1]*ts[k, m-1+j] - ts[k, idx-1]*ts[k, j-1])
+            np.multiply(ts[:, idx+m-1, np.newaxis], ts[:, m:n], out=update)
+            np.multiply(ts[:, idx-1, np.newaxis], ts[:, :l-1], out=update_b)
+            np.subtract(update, update_b, out=update)
+            dot[:, 1:] = dot[:, :-1]
+            np.add(dot[:, 1:], update, out=dot[:, 1:])
+            dot[:, 0] = dot_first[:, idx]
+
+        #res = 2*m*(1-(dot-m*mean[:, idx]*mean)/(m*std[:, idx]*std))
+        np.multiply(m*mean[:, idx, np.newaxis], mean, out=distanceProfile)
+        np.subtract(dot, distanceProfile, out=distanceProfile)
+        np.multiply(m*std[:, idx, np.newaxis], std, out=denominator)
+        np.divide(distanceProfile, denominator, out=distanceProfile)
+        np.subtract(1, distanceProfile, out=distanceProfile)
+        np.multiply(2*m, distanceProfile, out=distanceProfile)
+        np.maximum(distanceProfile, 0, out=distanceProfile)
+        #Constant subsequences are never matched in their dimension, their distances are 0/0 or x/0
+        np.copyto(distanceProfile, np.inf, where=constant)
+        distanceProfile[constant[:, idx]] = np.inf
+
+        trivialMatchRange = (int(max(0,idx - np.round(m/2,0))),int(min(idx + np.round(m/2+1,0),l)))
+        distanceProfile[:, trivialMatchRange[0]:trivialMatchRange[1]] = np.inf
+
+        #Mean of the k smallest squared distances, for every k
+        distanceProfile.sort(axis=0)
+        np.cumsum(distanceProfile, axis=0, out=distanceProfile)
+        np.divide(distanceProfile, counts, out=distanceProfile)
+
+        np.less(distanceProfile, mp, out=idsToUpdate)
+        np.copyto(mpIndex, idx, where=idsToUpdate)
+        np.minimum(mp, distanceProfile, out=mp)
+
+    return (np.sqrt(mp), mpIndex)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pan matrix profile: the matrix profiles of a time series for a whole range of
+window lengths. The series is traversed by diagonals as in SCRIMP. The dot
+products of a diagonal are the differences of one cumulative sum, so going
+from m to m + 1 only moves the end of the difference, and the moving means and
+standard deviations of every length come from the same cumulative sums.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+range = getattr(__builtins__, 'xrange', range)
+# end of py2 compatability boilerplate
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+class PanMatrixProfile(object):
+    """
+    Matrix profiles of one time series for several window lengths. Row r of
+    profiles and indexes holds the profile of windows[r], padded with nan and
+    -1 after its n - windows[r] + 1 values.
+
+    Parameters
+    ----------
+    windows: Sorted window lengths.
+    profiles: 2-D array of matrix profiles.
+    indexes: 2-D array of matrix profile indexes.
+    """
+    def __init__(self, windows, profiles, indexes):
+        self.windows = np.asarray(windows, dtype=int)
+        self.profiles = profiles
+        self.indexes = indexes
+        self.n = profiles.shape[1] + self.windows[0] - 1
+
+    def _row(self, m):
+        r = np.searchsorted(self.windows, m)
+        if r == len(self.windows) or self.windows[r] != m:
+            raise KeyError('window length {} was not computed'.format(m))
+        return r
+
+    def get(self, m, normalized=False):
+        """
+        Returns (profile, index) for the window length m.
+
+        Parameters
+        ----------
+        m: Window length.
+        normalized: Divide the distances by sqrt(2m), so profiles of different lengths are comparable.
+        """
+        r = self._row(m)
+        l = self.n - m + 1
+        profile = self.profiles[r, :l]
+        if normalized:
+            profile = profile / np.sqrt(2 * m)
+        return (profile, self.indexes[r, :l])
+
+    def __getitem__(self, m):
+        return self.get(m)
+
+    def __contains__(self, m):
+        try:
+            self._row(m)
+        except KeyError:
+            return False
+        return True
+
+
+def pan_matrix_profile(ts, windows):
+    """
+    Computes the self-join matrix profiles of ts for every window length in
+    windows. The exclusion zone of each length is the one used by stomp.
+
+    Parameters
+    ----------
+    ts: Time series.
+    windows: Iterable of window lengths, larger than one and not longer than ts.
+
+    Returns a PanMatrixProfile.
+    """
+    ts = np.array(ts, dtype=float)
+    ts[~np.isfinite(ts)] = 0
+    n = len(ts)
+    # the standard deviation of a constant subsequence from the cumulative sums is only zero up to
+    # rounding, so constant subsequences are found by counting the changes between consecutive values
+    changes = np.zeros(n, dtype=int)
+    np.cumsum(ts[1:] != ts[:-1], out=changes[1:])
+    # z-normalized distances do not change with an offset, centering keeps the cumulative sums small
+    ts = ts - np.mean(ts)
+
+    windows = np.unique(np.asarray(list(windows), dtype=int))
+    if len(windows) == 0 or windows[0] <= 1 or windows[-1] > n:
+        raise ValueError('window lengths must be larger than one and not longer than the time series')
+
+    M = windows[:, np.newaxis]
+    l = n - windows[0] + 1
+    positions = np.arange(l)
+    # valid[r, i] is True when the subsequence i of windows[r] exists
+    valid = positions < (n - M + 1)
+    ends = positions + M
+
+    # moving mean and standard deviation of every length from the same cumulative sums
+    s = np.zeros(n + windows[-1] + 1)
+    sSq = np.zeros(n + windows[-1] + 1)
+    np.cumsum(ts, out=s[1:n + 1])
+    np.cumsum(ts ** 2, out=sSq[1:n + 1])
+    mean = (s[ends] - s[positions]) / M
+    std = np.sqrt(np.maximum((sSq[ends] - sSq[positions]) / M - mean ** 2, 0))
+    constant = changes[np.minimum(ends - 1, n - 1)] == changes[positions]
+    # nan for constant subsequences and past the end of each length, so they are never matched
+    with np.errstate(divide='ignore'):
+        invStd = 1 / std
+    invStd[~valid | constant] = np.nan
+    invM = 1 / M
+
+    # the pearson correlation is tracked, the distance is sqrt(2m(1 - corr))
+    corr = np.full((len(windows), l), -np.inf)
+    indexes = np.full((len(windows), l), -1, dtype=int)
+
+    # diagonals closer than the exclusion zone of a length are trivial matches for it. As in
+    # stomp, the query i hides [i - round(m/2), i + round(m/2 + 1)) from the profile, so the
+    # pair (i, i + k) reaches the profile at i + k when k >= exclusionAfter and the profile
+    # at i when k >= exclusionBefore
+    exclusionAfter = np.round(windows / 2 + 1, 0).astype(int)
+    exclusionBefore = np.round(windows / 2, 0).astype(int) + 1
+
+    # dot products of the diagonal k for every length are c[i + m] - c[i], evenly spaced
+    # lengths read c[i + m] through a strided view instead of gathering it
+    c = np.zeros(n + windows[-1] + 1)
+    steps = np.diff(windows)
+    evenlySpaced = len(windows) == 1 or np.all(steps == steps[0])
+    if evenlySpaced:
+        step = steps[0] if len(steps) > 0 else 0
+        cEnds = as_strided(c[windows[0]:], shape=(len(windows), l), strides=(step * c.strides[0], c.strides[0]))
+    for k in range(max(1, min(exclusionAfter[0], exclusionBefore[0])), l):
+        np.cumsum(ts[:n - k] * ts[k:], out=c[1:n - k + 1])
+        d = l - k
+        # rows of the lengths whose exclusion zone does not contain the diagonal
+        rowsAfter = np.searchsorted(exclusionAfter, k, side='right')
+        rowsBefore = np.searchsorted(exclusionBefore, k, side='right')
+        rows = max(rowsAfter, rowsBefore)
+
+        if evenlySpaced:
+            diagonal = cEnds[:rows, :d] - c[:d]
+        else:
+            diagonal = c[ends[:rows, :d]]
+            diagonal -= c[:d]
+        diagonal *= invM[:rows]
+        diagonal -= mean[:rows, :d] * mean[:rows, k:k + d]
+        diagonal *= invStd[:rows, :d]
+        diagonal *= invStd[:rows, k:k + d]
+
+        # the pair (i, i + k) updates the profile at both ends
+        left = corr[:rowsBefore, :d]
+        update = diagonal[:rowsBefore] > left
+        np.copyto(left, diagonal[:rowsBefore], where=update)
+        np.copyto(indexes[:rowsBefore, :d], positions[k:], where=update)
+
+        right = corr[:rowsAfter, k:]
+        update = diagonal[:rowsAfter] > right
+        np.copyto(right, diagonal[:rowsAfter], where=update)
+        np.copyto(indexes[:rowsAfter, k:], positions[:d], where=update)
+
+    profiles = np.sqrt(np.maximum(2 * M * (1 - corr), 0))
+    profiles[~valid] = np.nan
+    return PanMatrixProfile(windows, profiles, indexes)
@@ -30,6 +30,8 @@ import warnings
 
 import numpy as np
 
+from . import backend
+
 
 def fast_find_nn_pre(ts, m):
     n = len(ts)
@@ -170,6 +172,10 @@ def calc_begin_idx(idx, step_size, idx_diff):
 
 def calc_dotproduct_begin_idx(ts, dp, beginidx, idx, idx_diff, m, 
                               idx_nn):
+    if backend.use_numba():
+        return backend.calc_dotproduct_begin_idx(ts, dp, beginidx, idx, 
+                                                 idx_diff, m, idx_nn)
+
     indices = list(range(idx - 1, beginidx - 1, -1))    
 
     if not indices:
@@ -210,6 +216,11 @@ def calc_refine_distance_begin_idx(refine_distance, dp, beginidx, idx,
 
 def apply_update_positions(matrix_profile, mp_index, refine_distance, beginidx,
                            endidx, orig_index, idx_diff):
+    if backend.use_numba():
+        return backend.apply_update_positions(matrix_profile, mp_index, 
+                                              refine_distance, beginidx, 
+                                              endidx, orig_index, idx_diff)
+
     tmp_a = refine_distance[beginidx:endidx+1]
     tmp_b = matrix_profile[beginidx:endidx+1]
     update_pos1 = np.argwhere(tmp_a < tmp_b).flatten()    
@@ -232,6 +243,9 @@ def apply_update_positions(matrix_profile, mp_index, refine_distance, beginidx,
 
 
 def calc_curlastz(ts, m, n, idx, profile_len, curlastz):
+    if backend.use_numba():
+        return backend.calc_curlastz(ts, m, n, idx, profile_len, curlastz)
+
     curlastz[idx] = np.sum(ts[0:m] * ts[idx:idx+m])
 
     tmp_a = ts[m:n - idx]
@@ -278,23 +292,12 @@ def time_is_exceeded(start_time, runtime):
     return exceeded
 
 
-def scrimp_plus_plus(ts, m, step_size=0.25, runtime=None, random_state=None):
-    """SCRIMP++ is an anytime algorithm that computes the matrix profile for a 
-    given time series (ts) over a given window size (m). Essentially, it allows
-    for an approximate solution to be provided for quicker analysis. In the 
-    case of this implementation, the runtime is measured based on the wall 
-    clock. If the number of seconds exceeds the runtime, then the approximate
-    solution is returned. If the runtime is None, the exact solution is 
-    returned.
-
-    This algorithm was created at the University of California Riverside. For
-    further academic understanding, please review this paper:
-
-    Matrix Proﬁle XI: SCRIMP++: Time Series Motif Discovery at Interactive
-    Speed. Yan Zhu, Chin-Chia Michael Yeh, Zachary Zimmerman, Kaveh Kamgar
-    Eamonn Keogh, ICDM 2018.
-
-    https://www.cs.ucr.edu/~eamonn/SCRIMP_ICDM_camera_ready_updated.pdf
+class ScrimpPlusPlus(object):
+    """Anytime SCRIMP++ computation that can be stepped, resumed, saved and
+    reloaded. The PreSCRIMP samples and the SCRIMP diagonals are both drawn in
+    the constructor, and every call to step processes the next ones. After
+    each step, matrix_profile and mp_index hold the best approximation found
+    so far. They are exact once progress reaches 1.
 
         Parameters
         ----------
@@ -305,152 +308,281 @@ def scrimp_plus_plus(ts, m, step_size=0.25, runtime=None, random_state=None):
         step_size : float, default 0.25
             The sampling interval for the window. The paper suggest 0.25 is the
             most practical. It should be a float value between 0 and 1.
-        runtime : int, default None
-            The maximum number of seconds based on wall clock time for this
-            algorithm to run. It computes the exact solution when it is set to
-            None.
         random_state : int, default None
             Set the random seed generator for reproducible results.
-
-        Returns
-        -------
-        (np.array, np.array)
-            The matrix profile and the matrix profile index respectively.
     """
-    # start the timer here
-    start_time = time.time()
-
-    # validate step_size
-    if not isinstance(step_size, float) or step_size > 1 or step_size < 0:
-        raise ValueError('step_size should be a float between 0 and 1.')
-
-    # validate runtime
-    if runtime is not None and (not isinstance(runtime, int) or runtime < 1):
-        raise ValueError('runtime should be a valid positive integer.')
-
-    # validate random_state
-    if random_state is not None:
-        try:
-            np.random.seed(random_state)
-        except:
-            raise ValueError('Invalid random_state value given.')
-    
-    ts_len = len(ts)
-
-    # set the trivial match range
-    exclusion_zone = calc_exclusion_zone(m)
-
-    # value checking
-    if m > ts_len / 2:
-        raise ValueError('Time series is too short relative to desired \
-            subsequence length')
-
-    if m < 4:
-        raise ValueError('Window size must be at least 4')
-
-    # initialization
-    step_size = calc_step_size(m, step_size)
-    profile_len = calc_profile_len(ts_len, m)
 
-    matrix_profile = np.zeros(profile_len)
-    mp_index = np.zeros(profile_len, dtype='int32')
+    def __init__(self, ts, m, step_size=0.25, random_state=None):
+        # validate step_size
+        if not isinstance(step_size, float) or step_size > 1 or step_size < 0:
+            raise ValueError('step_size should be a float between 0 and 1.')
+
+        # validate random_state
+        if random_state is not None:
+            try:
+                np.random.seed(random_state)
+            except:
+                raise ValueError('Invalid random_state value given.')
+
+        ts = np.asarray(ts, dtype=float)
+        ts_len = len(ts)
+
+        # value checking
+        if m > ts_len / 2:
+            raise ValueError('Time series is too short relative to desired \
+                subsequence length')
+
+        if m < 4:
+            raise ValueError('Window size must be at least 4')
+
+        self.ts = ts
+        self.m = m
+        self.step_size = calc_step_size(m, step_size)
+        self._prepare()
+
+        profile_len = self.profile_len
+        self.matrix_profile = np.zeros(profile_len)
+        self.mp_index = np.zeros(profile_len, dtype='int32')
+        self.dotproduct = np.zeros(profile_len)
+        self.refine_distance = np.full(profile_len, np.inf)
+
+        orig_index = np.arange(profile_len)
+        self.prescrimp_order = np.arange(0, profile_len, self.step_size)
+        np.random.shuffle(self.prescrimp_order)
+        self.scrimp_order = orig_index[orig_index > self.exclusion_zone]
+        np.random.shuffle(self.scrimp_order)
+
+        self.prescrimp_position = 0
+        self.scrimp_position = 0
+
+    def _prepare(self):
+        """Computes the values derived from ts, which are not saved."""
+        self.exclusion_zone = calc_exclusion_zone(self.m)
+        self.profile_len = calc_profile_len(len(self.ts), self.m)
+        self.orig_index = np.arange(self.profile_len)
+        (self.X, self.n, _, _, self.meanx, _, 
+         self.sigmax) = fast_find_nn_pre(self.ts, self.m)
+
+    @property
+    def total_iterations(self):
+        """Number of PreSCRIMP samples plus number of SCRIMP diagonals."""
+        return len(self.prescrimp_order) + len(self.scrimp_order)
+
+    @property
+    def progress(self):
+        """Fraction of the PreSCRIMP samples and SCRIMP diagonals processed."""
+        total = self.total_iterations
+        if total == 0:
+            return 1.0
+
+        return (self.prescrimp_position + self.scrimp_position) / total
+
+    @property
+    def is_done(self):
+        return self.scrimp_position >= len(self.scrimp_order)
+
+    def _prescrimp_iteration(self):
+        iteration = self.prescrimp_position
+        idx = self.prescrimp_order[iteration]
+        ts, m, profile_len = self.ts, self.m, self.profile_len
+        meanx, sigmax = self.meanx, self.sigmax
 
-    X, n, sumx2, sumx, meanx, sigmax2, sigmax = fast_find_nn_pre(ts, m)
-
-    ###########################
-    # PreSCRIMP
-    #
-    # compute distance profile
-    dotproduct = np.zeros(profile_len)
-    refine_distance = np.full(profile_len, np.inf)
-    orig_index = np.arange(profile_len)
-
-    compute_order = list(range(0, profile_len, step_size))
-    np.random.shuffle(compute_order)
-
-    for iteration, idx in enumerate(compute_order):
         # compute distance profile
         subsequence = next_subsequence(ts, idx, m)
-        
-        distance_profile = calc_distance_profile(X, subsequence, n, m, meanx,
-                                                 sigmax)
-        
+
+        distance_profile = calc_distance_profile(self.X, subsequence, self.n,
+                                                 m, meanx, sigmax)
+
         # apply exclusion zone
         distance_profile = apply_exclusion_zone(
-            idx, exclusion_zone, profile_len, distance_profile)
-        
+            idx, self.exclusion_zone, profile_len, distance_profile)
+
         # find and store nearest neighbor
-        matrix_profile, mp_index, idx_nn = find_and_store_nn(
-            iteration, idx, matrix_profile, mp_index, distance_profile)
+        self.matrix_profile, self.mp_index, idx_nn = find_and_store_nn(
+            iteration, idx, self.matrix_profile, self.mp_index,
+            distance_profile)
 
         idx_diff = calc_idx_diff(idx, idx_nn)
-        dotproduct = calc_dotproduct_idx(dotproduct, m, matrix_profile, idx,
-                                         sigmax, idx_nn, meanx)
+        dotproduct = calc_dotproduct_idx(self.dotproduct, m,
+                                         self.matrix_profile, idx, sigmax,
+                                         idx_nn, meanx)
 
-        endidx = calc_end_idx(profile_len, idx, step_size, idx_diff)
+        endidx = calc_end_idx(profile_len, idx, self.step_size, idx_diff)
 
         dotproduct = calc_dotproduct_end_idx(ts, dotproduct, idx, m,
                                              endidx, idx_nn, idx_diff)
 
         refine_distance = calc_refine_distance_end_idx(
-            refine_distance, dotproduct, idx, endidx, meanx, sigmax, idx_nn,
-            idx_diff, m)
-        
-        beginidx = calc_begin_idx(idx, step_size, idx_diff)
+            self.refine_distance, dotproduct, idx, endidx, meanx, sigmax,
+            idx_nn, idx_diff, m)
+
+        beginidx = calc_begin_idx(idx, self.step_size, idx_diff)
 
         dotproduct = calc_dotproduct_begin_idx(
             ts, dotproduct, beginidx, idx, idx_diff, m, idx_nn)
 
         refine_distance = calc_refine_distance_begin_idx(
-            refine_distance, dotproduct, beginidx, idx, idx_diff, idx_nn, 
+            refine_distance, dotproduct, beginidx, idx, idx_diff, idx_nn,
             sigmax, meanx, m)
 
-        matrix_profile, mp_index = apply_update_positions(matrix_profile, 
-                                                          mp_index, 
-                                                          refine_distance, 
-                                                          beginidx, 
-                                                          endidx, 
-                                                          orig_index, idx_diff)
-
-        # check if time is up
-        if time_is_exceeded(start_time, runtime):            
-            break
-
-    if not time_is_exceeded(start_time, runtime):
-        ###########################
-        # SCRIMP
-        #
-        compute_order = orig_index[orig_index > exclusion_zone]
-        np.random.shuffle(compute_order)
-
-        curlastz = np.zeros(profile_len)
-        curdistance = np.zeros(profile_len)
+        self.matrix_profile, self.mp_index = apply_update_positions(
+            self.matrix_profile, self.mp_index, refine_distance, beginidx,
+            endidx, self.orig_index, idx_diff)
+
+        self.dotproduct = dotproduct
+        self.refine_distance = refine_distance
+        self.prescrimp_position += 1
+
+    def _scrimp_iteration(self):
+        idx = self.scrimp_order[self.scrimp_position]
+        profile_len = self.profile_len
+        matrix_profile, mp_index = self.matrix_profile, self.mp_index
+
+        curlastz = calc_curlastz(self.ts, self.m, self.n, idx, profile_len,
+                                 np.zeros(profile_len))
+        curdistance = calc_curdistance(curlastz, self.meanx, self.sigmax, idx,
+                                       profile_len, self.m,
+                                       np.zeros(profile_len))
+
+        # curdistance[j] is the distance between the subsequences j and j - idx
         dist1 = np.full(profile_len, np.inf)
+        dist1[idx:profile_len] = curdistance[idx:profile_len]
+
         dist2 = np.full(profile_len, np.inf)
+        dist2[0:profile_len - idx] = curdistance[idx:profile_len]
+
+        loc1 = dist1 < matrix_profile
+        if loc1.any():
+            matrix_profile[loc1] = dist1[loc1]
+            mp_index[loc1] = self.orig_index[loc1] - idx
+
+        loc2 = dist2 < matrix_profile
+        if loc2.any():
+            matrix_profile[loc2] = dist2[loc2]
+            mp_index[loc2] = self.orig_index[loc2] + idx
+
+        self.scrimp_position += 1
+
+    def step(self, iterations=None, seconds=None):
+        """Processes the next PreSCRIMP samples or SCRIMP diagonals until
+        the budget is spent or the computation is done. Without a budget
+        the computation runs to the end.
+
+            Parameters
+            ----------
+            iterations : int, default None
+                The maximum number of samples or diagonals to process.
+            seconds : float, default None
+                The maximum number of seconds based on wall clock time. The
+                check is done after each iteration.
+
+            Returns
+            -------
+            (np.array, np.array)
+                Copies of the current matrix profile and matrix profile index.
+        """
+        start_time = time.time()
+        done = 0
+
+        while not self.is_done:
+            if iterations is not None and done >= iterations:
+                break
 
-        for idx in compute_order:
-            curlastz = calc_curlastz(ts, m, n, idx, profile_len, curlastz)
-            curdistance = calc_curdistance(curlastz, meanx, sigmax, idx, 
-                                           profile_len, m, curdistance)
+            if self.prescrimp_position < len(self.prescrimp_order):
+                self._prescrimp_iteration()
+            else:
+                self._scrimp_iteration()
+            done += 1
 
-            dist1[0:idx-1] = np.inf
-            dist1[idx:profile_len] = curdistance[idx:profile_len]
+            if seconds is not None and time.time() - start_time >= seconds:
+                break
 
-            dist2[0:profile_len - idx] = curdistance[idx:profile_len]
-            dist2[profile_len - idx + 2:profile_len] = np.inf
+        return (self.matrix_profile.copy(), self.mp_index.copy())
+
+    def save(self, path):
+        """Saves the state of the computation into a .npz file."""
+        np.savez(path, ts=self.ts, m=self.m, step_size=self.step_size,
+                 matrix_profile=self.matrix_profile, mp_index=self.mp_index,
+                 dotproduct=self.dotproduct,
+                 refine_distance=self.refine_distance,
+                 prescrimp_order=self.prescrimp_order,
+                 scrimp_order=self.scrimp_order,
+                 prescrimp_position=self.prescrimp_position,
+                 scrimp_position=self.scrimp_position)
+
+    @classmethod
+    def load(cls, path):
+        """Restores a computation saved with save, it can be stepped again."""
+        obj = cls.__new__(cls)
+        with np.load(path, allow_pickle=False) as data:
+            obj.ts = data['ts']
+            obj.m = int(data['m'])
+            obj.step_size = int(data['step_size'])
+            obj.matrix_profile = data['matrix_profile']
+            obj.mp_index = data['mp_index']
+            obj.dotproduct = data['dotproduct']
+            obj.refine_distance = data['refine_distance']
+            obj.prescrimp_order = data['prescrimp_order']
+            obj.scrimp_order = data['scrimp_order']
+            obj.prescrimp_position = int(data['prescrimp_position'])
+            obj.scrimp_position = int(data['scrimp_position'])
+
+        obj._prepare()
+        return obj
 
-            loc1 = dist1 < matrix_profile
-            if loc1.any():
-                matrix_profile[loc1] = dist1[loc1]
-                mp_index[loc1] = orig_index[loc1] - idx + 1
 
-            loc2 = dist2 < matrix_profile
-            if loc2.any():
-                matrix_profile[loc2] = dist2[loc2]
-                mp_index[loc2] = orig_index[loc2] + idx - 1
+def scrimp_plus_plus(ts, m, step_size=0.25, runtime=None, random_state=None):
+    """SCRIMP++ is an anytime algorithm that computes the matrix profile for a 
+    given time series (ts) over a given window size (m). Essentially, it allows
+    for an approximate solution to be provided for quicker analysis. In the 
+    case of this implementation, the runtime is measured based on the wall 
+    clock. If the number of seconds exceeds the runtime, then the approximate
+    solution is returned. If the runtime is None, the exact solution is 
+    returned. Use ScrimpPlusPlus to keep refining the approximate solution
+    later.
 
-            # check if time is up
-            if time_is_exceeded(start_time, runtime):             
-                break
+    This algorithm was created at the University of California Riverside. For
+    further academic understanding, please review this paper:
+
+    Matrix Proﬁle XI: SCRIMP++: Time Series Motif Discovery at Interactive
+    Speed. Yan Zhu, Chin-Chia Michael Yeh, Zachary Zimmerman, Kaveh Kamgar
+    Eamonn Keogh, ICDM 2018.
+
+    https://www.cs.ucr.edu/~eamonn/SCRIMP_ICDM_camera_ready_updated.pdf
+
+        Parameters
+        ----------
+        ts : np.ndarray
+            The time series to compute the matrix profile for.
+        m : int
+            The window size.
+        step_size : float, default 0.25
+            The sampling interval for the window. The paper suggest 0.25 is the
+            most practical. It should be a float value between 0 and 1.
+        runtime : int, default None
+            The maximum number of seconds based on wall clock time for this
+            algorithm to run. It computes the exact solution when it is set to
+            None.
+        random_state : int, default None
+            Set the random seed generator for reproducible results.
 
-    return (matrix_profile, mp_index)
\ No newline at end of file
+        Returns
+        -------
+        (np.array, np.array)
+            The matrix profile and the matrix profile index respectively.
+    """
+    # validate runtime
+    if runtime is not None and (not isinstance(runtime, int) or runtime < 1):
+        raise ValueError('runtime should be a valid positive integer.')
+
+    scrimp = ScrimpPlusPlus(ts, m, step_size=step_size, 
+                            random_state=random_state)
+    matrix_profile, mp_index = scrimp.step(seconds=runtime)
+
+    if not scrimp.is_done:
+        warnings.warn(
+            'Max runtime exceeded. Approximate solution is given.',
+            RuntimeWarning
+        )
+
+    return (matrix_profile, mp_index)
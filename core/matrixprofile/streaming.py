@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+"""
+Incremental (STAMPI) matrix profile of a stream. Every new point adds one
+subsequence, its sliding dot product is updated from the one of the previous
+arrival in O(n), and the left and right matrix profiles are kept in buffers
+that are only reallocated when they are full.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+range = getattr(__builtins__, 'xrange', range)
+# end of py2 compatability boilerplate
+
+import numpy as np
+
+from .utils import slidingDotProduct, PreparedSeries
+
+
+class StreamingMatrixProfile(object):
+    """
+    Streaming matrix profile with left and right profiles.
+
+    Values live in buffers of twice the horizon (or a growing capacity when there
+    is no horizon). The live window is a contiguous slice of the buffers, so once
+    the end is reached the window is moved back to the beginning, which costs
+    O(1) amortized per arrival. Indexes are global positions in the stream.
+
+    When a horizon is set the oldest values age out. The right profile is always
+    exact, since right neighbors are newer. When a left neighbor ages out, the
+    subsequence is marked and its left neighbor is searched again among the
+    retained values the next time the left profile is read, so the profiles are
+    always those of the current window.
+
+    Parameters
+    ----------
+    m: Length of subsequence to compare.
+    horizon: Maximum number of values kept, None keeps the whole stream.
+    capacity: Initial capacity of the buffers when there is no horizon.
+    """
+    def __init__(self, m, horizon=None, capacity=1024):
+        if m <= 1:
+            raise ValueError("Query length must be longer than one")
+        if horizon is not None and horizon < m:
+            raise ValueError("horizon must not be shorter than the subsequence length")
+
+        self.m = m
+        self.horizon = horizon
+        self.exclusionZone = int(np.round(m/2,0))
+
+        size = 2 * horizon if horizon is not None else max(capacity, 2 * m)
+        self._allocate(size)
+
+        #Live window is [_start, _end) of the buffers, _offset is the stream position of _start
+        self._start = 0
+        self._end = 0
+        self._offset = 0
+        self._dotValid = False
+
+    def _allocate(self, size):
+        self._values = np.zeros(size)
+        self._mean = np.zeros(size)
+        self._std = np.zeros(size)
+        self._dot = np.zeros(size)
+        self._leftMp = np.full(size, np.inf)
+        self._leftIndex = np.full(size, -1, dtype=int)
+        self._rightMp = np.full(size, np.inf)
+        self._rightIndex = np.full(size, -1, dtype=int)
+        self._leftStale = np.zeros(size, dtype=bool)
+        self._constant = np.zeros(size, dtype=bool)
+
+    def _buffers(self):
+        return [self._values, self._mean, self._std, self._dot,
+                self._leftMp, self._leftIndex, self._rightMp, self._rightIndex, self._leftStale, self._constant]
+
+    def _make_room(self):
+        length = self._end - self._start
+        size = len(self._values)
+
+        if self.horizon is None and length > size // 2:
+            #Grow by doubling
+            old = self._buffers()
+            self._allocate(2 * size)
+            for new, values in zip(self._buffers(), old):
+                new[:length] = values[self._start:self._end]
+        else:
+            for values in self._buffers():
+                values[:length] = values[self._start:self._end]
+
+        self._start = 0
+        self._end = length
+        #The dot product is computed again with the FFT, which also resets the rounding errors of the recurrence
+        self._dotValid = False
+
+    def _drop_oldest(self):
+        dropped = self._offset
+        self._start += 1
+        self._offset += 1
+
+        last = self._end - self.m + 1
+        if last > self._start:
+            leftIndex = self._leftIndex[self._start:last]
+            agedOut = leftIndex == dropped
+            self._leftMp[self._start:last][agedOut] = np.inf
+            leftIndex[agedOut] = -1
+            #Left neighbors do not change with new arrivals, so the search can wait until they are read
+            self._leftStale[self._start:last][agedOut] = True
+
+    def _refresh_left(self, stale=None, blockSize=256):
+        """
+        Searches the left neighbor of the subsequences whose neighbor aged out,
+        among the subsequences of the window outside their exclusion zone. The
+        window is prepared once and the queries are searched by blocks with a
+        batched MASS.
+
+        stale: Window offsets of the subsequences to search, None searches every marked one.
+        """
+        m = self.m
+        s = self._start
+        last = self._end - m + 1
+        if stale is None:
+            stale = np.flatnonzero(self._leftStale[s:last])
+        if len(stale) == 0:
+            return
+        self._leftStale[s + stale] = False
+
+        window = PreparedSeries(self._values[s:self._end])
+        subsequences = np.lib.stride_tricks.sliding_window_view(self._values[s:self._end], m)
+        positions = np.arange(last - s)
+        for begin in range(0, len(stale), blockSize):
+            rows = stale[begin:begin+blockSize]
+            distanceProfiles = np.sqrt(np.maximum(window.mass_many(subsequences[rows]), 0))
+            #Constant subsequences are never matched, and left neighbors end before the exclusion zone
+            distanceProfiles[:, self._constant[s:last]] = np.inf
+            distanceProfiles[positions[np.newaxis, :] >= (rows - self.exclusionZone)[:, np.newaxis]] = np.inf
+
+            best = np.argmin(distanceProfiles, axis=1)
+            bestMp = distanceProfiles[np.arange(len(rows)), best]
+            found = bestMp < np.inf
+            self._leftMp[s + rows[found]] = bestMp[found]
+            self._leftIndex[s + rows[found]] = self._offset + best[found]
+
+    def append(self, value):
+        """
+        Adds a new value to the stream and updates the profiles.
+
+        Parameters
+        ----------
+        value: New value, nan and inf values are replaced with zeros.
+
+        Returns the stream position of the new subsequence, None while the window is shorter than m.
+        """
+        if not np.isfinite(value):
+            value = 0
+
+        if self._end == len(self._values):
+            self._make_room()
+
+        self._values[self._end] = value
+        self._end += 1
+
+        if self.horizon is not None and self._end - self._start > self.horizon:
+            self._drop_oldest()
+
+        if self._end - self._start < self.m:
+            return None
+
+        return self._add_subsequence()
+
+    def extend(self, values):
+        """
+        Adds several values to the stream, in order.
+        """
+        for value in values:
+            self.append(value)
+
+    def _add_subsequence(self):
+        m = self.m
+        s = self._start
+        i = self._end - m
+        values = self._values
+
+        query = values[i:i+m]
+        self._mean[i] = np.mean(query)
+        self._std[i] = np.std(query)
+        #The standard deviation of a constant subsequence is not always exactly zero
+        self._constant[i] = np.all(query == query[0])
+
+        dot = self._dot
+        if self._dotValid and i > s:
+            #dot[j] = dot_prev[j-1] - T[i-1]*T[j-1] + T[i+m-1]*T[j+m-1]
+            dot[s+1:i+1] = dot[s:i] - values[i-1] * values[s:i] + values[i+m-1] * values[s+m:i+m]
+            dot[s] = np.dot(query, values[s:s+m])
+        else:
+            dot[s:i+1] = slidingDotProduct(query, values[s:self._end])
+            self._dotValid = True
+
+        mean = self._mean[s:i+1]
+        std = self._std[s:i+1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distanceProfile = 2*m*(1-(dot[s:i+1]-m*self._mean[i]*mean)/(m*self._std[i]*std))
+        distanceProfile = np.sqrt(np.maximum(distanceProfile, 0))
+        #Constant subsequences are never matched, their distances are 0/0 or x/0
+        if self._constant[i]:
+            distanceProfile[:] = np.inf
+        else:
+            distanceProfile[self._constant[s:i+1]] = np.inf
+        distanceProfile[max(0, i - s - self.exclusionZone):] = np.inf
+
+        position = self._offset + i - s
+        self._leftMp[i] = np.inf
+        self._leftIndex[i] = -1
+        self._leftStale[i] = False
+        self._rightMp[i] = np.inf
+        self._rightIndex[i] = -1
+
+        if i > s:
+            best = np.argmin(distanceProfile)
+            if distanceProfile[best] < np.inf:
+                self._leftMp[i] = distanceProfile[best]
+                self._leftIndex[i] = self._offset + best
+
+            rightMp = self._rightMp[s:i+1]
+            idsToUpdate = distanceProfile < rightMp
+            rightMp[idsToUpdate] = distanceProfile[idsToUpdate]
+            self._rightIndex[s:i+1][idsToUpdate] = position
+
+        return position
+
+    @property
+    def offset(self):
+        """Stream position of the first value in the window."""
+        return self._offset
+
+    def left_neighbor(self, position):
+        """(distance, index) of the left nearest neighbor of the subsequence at a stream position, index is -1 if there is none."""
+        i = self._start + position - self._offset
+        if position < self._offset or i > self._end - self.m:
+            raise IndexError("position is not in the window")
+        #The left neighbor found on arrival is final unless it aged out, only that row is searched again
+        if self._leftStale[i]:
+            self._refresh_left(np.array([i - self._start]))
+        return (self._leftMp[i], self._leftIndex[i])
+
+    @property
+    def values(self):
+        return self._values[self._start:self._end].copy()
+
+    def _profile_slice(self):
+        return slice(self._start, max(self._start, self._end - self.m + 1))
+
+    @property
+    def left_profile(self):
+        """(profile, index) of the nearest neighbor before each subsequence."""
+        self._refresh_left()
+        window = self._profile_slice()
+        return (self._leftMp[window].copy(), self._leftIndex[window].copy())
+
+    @property
+    def right_profile(self):
+        """(profile, index) of the nearest neighbor after each subsequence."""
+        window = self._profile_slice()
+        return (self._rightMp[window].copy(), self._rightIndex[window].copy())
+
+    @property
+    def profile(self):
+        """(profile, index) of the window, the minimum of the left and right profiles."""
+        leftMp, leftIndex = self.left_profile
+        rightMp, rightIndex = self.right_profile
+        useRight = rightMp < leftMp
+        return (np.where(useRight, rightMp, leftMp), np.where(useRight, rightIndex, leftIndex))
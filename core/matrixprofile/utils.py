@@ -9,6 +9,8 @@ range = getattr(__builtins__, 'xrange', range)
 
 import numpy as np
 import numpy.fft as fft
+import hashlib
+from collections import OrderedDict
 
 def zNormalize(ts):
     """
@@ -91,6 +93,26 @@ def movstd(ts,m):
 
     return np.sqrt(segSumSq / m - (segSum/m) ** 2)
 
+def movconstant(ts,m):
+    """
+    Flags the constant subsequences of a time series. The moving standard deviation of a
+    constant window is only zero up to the rounding of the cumulative sums, so the values
+    are compared instead: a window is constant when no two consecutive values in it differ.
+
+    Parameters
+    ----------
+    ts: Time series to evaluate.
+    m: Width of the moving window.
+    """
+    if m <= 1:
+        raise ValueError("Query length must be longer than one")
+
+    ts = np.asarray(ts)
+    #Number of changes between consecutive values up to each position
+    changes = np.insert(np.cumsum(ts[1:] != ts[:-1]),0,0)
+
+    return changes[m-1:] == changes[:len(changes)-m+1]
+
 def slidingDotProduct(query,ts):
     """
     Calculate the dot product between a query and all subsequences of length(query) in the timeseries ts. Note that we use Numpy's rfft method instead of fft.
@@ -179,6 +201,141 @@ def mass(query,ts):
 
     return res
 
+class PreparedSeries(object):
+    """
+    A time series prepared for repeated MASS queries. The rFFT of the series is computed once and the moving mean and standard deviation are cached per query length, so every query only costs one rFFT of the query and one inverse rFFT.
+
+    Parameters
+    ----------
+    ts: Time series to compare queries against.
+    """
+    def __init__(self, ts):
+        self.ts = np.asarray(ts, dtype="float")
+        self.n = len(self.ts)
+        #The circular convolution of length n is exact from index m-1 onwards, which are the only values kept
+        self.n_fft = self.n
+        self.fft = fft.rfft(self.ts, self.n_fft)
+        self._movmeanstd = {}
+
+    def movmeanstd(self, m):
+        """
+        Returns the cached moving mean and standard deviation for the window length m.
+        """
+        if m not in self._movmeanstd:
+            self._movmeanstd[m] = movmeanstd(self.ts, m)
+        return self._movmeanstd[m]
+
+    def slidingDotProduct(self, query):
+        """
+        Calculate the dot product between a query and all subsequences of length(query) in the prepared series.
+        """
+        m = len(query)
+        query = np.asarray(query, dtype="float")[::-1]
+        dot_product = fft.irfft(self.fft * fft.rfft(query, self.n_fft), self.n_fft)
+        return dot_product[m-1:self.n]
+
+    def mass(self, query):
+        """
+        Same as mass(query, ts) for the prepared series. Note that we are returning the square of MASS.
+        """
+        m = len(query)
+        q_mean = np.mean(query)
+        q_std = np.std(query)
+        mean, std = self.movmeanstd(m)
+        dot = self.slidingDotProduct(query)
+
+        res = 2*m*(1-(dot-m*mean*q_mean)/(m*std*q_std))
+
+        return res
+
+    def mass_many(self, queries):
+        """
+        Same as mass for every row of the 2-D array queries, the sliding dot products of all queries are computed with a single batched rFFT and inverse rFFT.
+        """
+        queries = np.asarray(queries, dtype="float")
+        m = queries.shape[1]
+        q_mean = np.mean(queries, axis=1)[:, np.newaxis]
+        q_std = np.std(queries, axis=1)[:, np.newaxis]
+        mean, std = self.movmeanstd(m)
+
+        dot = fft.irfft(self.fft * fft.rfft(queries[:, ::-1], self.n_fft, axis=1), self.n_fft, axis=1)[:, m-1:self.n]
+
+        res = 2*m*(1-(dot-m*mean*q_mean)/(m*std*q_std))
+
+        return res
+
+
+#Least recently used prepared series, keyed by the content of the series
+_preparedSeries = OrderedDict()
+_preparedSeriesMaxSize = 8
+
+def set_prepared_series_cache_size(size):
+    """
+    Sets how many prepared series are kept by prepare_series. 0 disables the cache.
+
+    Parameters
+    ----------
+    size: Maximum number of prepared series.
+    """
+    global _preparedSeriesMaxSize
+    _preparedSeriesMaxSize = size
+    while len(_preparedSeries) > size:
+        _preparedSeries.popitem(last=False)
+
+def prepare_series(ts):
+    """
+    Returns the PreparedSeries of ts, reusing a cached one when a series with the same values was prepared recently.
+
+    Parameters
+    ----------
+    ts: Time series to prepare.
+    """
+    ts = np.ascontiguousarray(ts, dtype="float")
+    key = (len(ts), hashlib.sha1(ts.view(np.uint8)).hexdigest())
+
+    prepared = _preparedSeries.get(key)
+    if prepared is not None:
+        _preparedSeries.move_to_end(key)
+        return prepared
+
+    prepared = PreparedSeries(ts)
+    if _preparedSeriesMaxSize > 0:
+        _preparedSeries[key] = prepared
+        while len(_preparedSeries) > _preparedSeriesMaxSize:
+            _preparedSeries.popitem(last=False)
+
+    return prepared
+
+def mass_many(queries,ts,k=None):
+    """
+    Batched MASS of several equal length queries against the same time series. Note that, as in mass, we are returning the square of MASS.
+
+    Parameters
+    ----------
+    queries: 2-D array with one query per row, or list of equal length queries.
+    ts: Time series to compare against the queries.
+    k: If provided, the indexes of the k best matches of each query are returned too.
+
+    Returns the (Q, n-m+1) array of squared distances, and when k is provided a tuple (distances, indexes) where indexes is a (Q, k) array sorted by distance.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype="float"))
+    if queries.shape[1] > len(ts):
+        raise ValueError("Queries must not be longer than the time series")
+
+    res = prepare_series(ts).mass_many(queries)
+
+    if k is None:
+        return res
+
+    k = min(k, res.shape[1])
+    #NaN values, from constant subsequences, are sorted last
+    order = np.where(np.isnan(res), np.inf, res)
+    indexes = np.argpartition(order, k - 1, axis=1)[:, :k]
+    rows = np.arange(len(res))[:, np.newaxis]
+    indexes = indexes[rows, np.argsort(order[rows, indexes], axis=1)]
+
+    return res, indexes
+
 def massStomp(query,ts,dot_first,dot_prev,index,mean,std):
     """
     Calculates Mueen's ultra-fast Algorithm for Similarity Search (MASS) between a query and timeseries using the STOMP dot product speedup. Note that we are returning the square of MASS.
@@ -5,9 +5,12 @@ import numpy as np
 import copy
 import matrixprofile as mp
 from .utils import is_array_like, to_np_array
-from .matrixprofile import matrixProfile as mpts
 from .matrixprofile.motifs import motifs
 from .matrixprofile.discords import discords
+from .matrix_profile import serie_matrix_profile
+from .matrixprofile.mstamp import mstomp
+from .matrixprofile.streaming import StreamingMatrixProfile
+from .matrixprofile.pmp import pan_matrix_profile
 from enum import Enum
 
 class IndexType(Enum):
@@ -159,6 +162,9 @@ class MTSerie:
         self.numericalFeatures = {}
         self.mp = {}
         self.mp_window_size = None
+        self.mmp = None
+        self.pmp = {}
+        self.mpStreams = {}
         self._indexType = IndexType.INT
         
         super().__init__()
@@ -177,6 +183,11 @@ class MTSerie:
         assert self.isDataDated
         downsampledMTSerie = self.clone()
         downsampledMTSerie.dataframe = self.dataframe.resample(rule).mean()
+        # * profiles of the original values do not apply to the downsampled ones
+        downsampledMTSerie.mp = {}
+        downsampledMTSerie.mp_window_size = None
+        downsampledMTSerie.mmp = None
+        downsampledMTSerie.pmp = {}
         return downsampledMTSerie
     
     def downsample_rules(self) -> list:
@@ -190,6 +201,10 @@ class MTSerie:
         mtserie.numericalFeatures = copy.deepcopy(self.numericalFeatures)
         mtserie.categoricalFeatures = copy.deepcopy(self.categoricalFeatures)
         mtserie.indexType = self.indexType
+        mtserie.mp = {varName: (np.copy(profile), np.copy(index)) for varName, (profile, index) in self.mp.items()}
+        mtserie.mp_window_size = self.mp_window_size
+        mtserie.mmp = copy.deepcopy(self.mmp)
+        mtserie.pmp = copy.deepcopy(self.pmp)
         return mtserie
     
     def get_serie(self, label):
@@ -206,22 +221,50 @@ class MTSerie:
         for label in _labels:
             self.dataframe[label] = (self.dataframe[label] - self.dataframe[label].mean()) / self.dataframe[label].std(ddof=0)
     
-    def compute_matrix_profile(self, L):
+    def compute_matrix_profile(self, L, algorithm = 'stomp'):
         for varName in self.labels:
-            self.mp[varName] = mpts.stomp(self.get_serie(varName), L)
+            self.mp[varName] = serie_matrix_profile(self.get_serie(varName), L, algorithm=algorithm)
         self.mp_window_size = L
         
+    def compute_multidimensional_matrix_profile(self, L, labels = []):
+        _labels = labels
+        if len(labels) == 0:
+            _labels = self.labels
+        profile, index = mstomp(np.array([self.get_serie(label) for label in _labels]), L)
+        # * row k - 1 of profile and index is the k-dimensional matrix profile
+        self.mmp = {'labels': _labels, 'window_size': L, 'profile': profile, 'index': index}
+        return self.mmp
+        
+    def compute_pan_matrix_profile(self, windows, labels = []):
+        _labels = labels
+        if len(labels) == 0:
+            _labels = self.labels
+        # * one (windows, timeLen - min(windows) + 1) array per variable, the work is shared across window sizes
+        for label in _labels:
+            self.pmp[label] = pan_matrix_profile(self.get_serie(label), windows)
+        
+    def get_pan_matrix_profile(self, label, L, normalized = False):
+        # * normalized divides by sqrt(2L), so profiles of different window sizes can be compared
+        return self.pmp[label].get(L, normalized=normalized)
+        
+    def stream_matrix_profile(self, label, L, horizon = None):
+        # * the stream starts with the current values, new ones are added with append
+        stream = StreamingMatrixProfile(L, horizon=horizon, capacity=max(2 * self.timeLen, 1024))
+        stream.extend(self.get_serie(label))
+        self.mpStreams[label] = stream
+        return stream
+        
     def get_variable_motifs(self, label, maxMotifs = 8):
         return motifs(self.get_serie(label), self.mp[label], maxMotifs)
     
     def analize_var_matrix_profile(self, label):
         profile, figures = mp.analyze(self.get_serie(label))
         
-    def get_discords(self, varName):
-        mp, _ = np.copy(self.mp[varName])
-        mp = np.append(mp,np.zeros(self.mp_window_size-1)+np.nan)
+    def get_discords(self, varName, k = 2):
+        # * discords reads the profile without modifying it, no copy is needed
+        mp, _ = self.mp[varName]
         ex_zone = self.mp_window_size
-        anoms = discords(mp, ex_zone, k=2)
+        anoms = discords(mp, ex_zone, k=k)
         return anoms
         
     # !deprecated
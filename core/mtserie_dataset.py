@@ -1,8 +1,15 @@
+import os
 import numpy as np
 from .mtserie import MTSerie
 from numpy import unique
 from .distances import DistanceType
-from .projections import distance_matrix, mds_projection
+from .projections import distance_matrix, blocked_distance_matrix, blocked_reweight, mds_projection, knn_projection, dtw_nearest_neighbors, k_distances_to, combine_distance_matrixes, stack_variable
+from .distances import lb_keogh_envelopes
+from .knn_graph import knn_graph
+from .subsequence_search import SubsequenceIndex
+from .matrix_profile import matrix_profiles, series_motifs, pan_matrix_profiles
+from .matrixprofile.discords import discords
+from scipy import sparse
 from sklearn.cluster import SpectralClustering, KMeans, DBSCAN
 
 class MTSerieDataset:
@@ -26,6 +33,8 @@ class MTSerieDataset:
     
     @property
     def distanceMatrix(self) -> np.ndarray:
+        if self._distanceMatrix is None and self._distanceMatrixFiles is not None:
+            self._distanceMatrix = self._open_distance_memmap('D')
         return self._distanceMatrix
     
     @distanceMatrix.setter
@@ -34,12 +43,18 @@ class MTSerieDataset:
     
     @property
     def distanceMatrix_k(self) -> list:
+        if self._distanceMatrix_k is None and self._distanceMatrixFiles is not None:
+            self._distanceMatrix_k = self._open_distance_memmap('D_k')
         return self._distanceMatrix_k
     
     @distanceMatrix_k.setter
-    def distanceMatrix(self, value):
+    def distanceMatrix_k(self, value):
         self._distanceMatrix_k = value
     
+    @property
+    def knnGraph(self) -> sparse.csr_matrix:
+        return self._knnGraph
+    
     @property
     def ids(self) -> list:
         return list(self.mtseries.keys())
@@ -89,6 +104,13 @@ class MTSerieDataset:
         self._isDataUniformInVariables = True
         self._distanceMatrix = None
         self._distanceMatrix_k = None
+        self._distanceParams = None
+        self._distanceMatrixFiles = None
+        self._squaredDistanceMatrixes = {}
+        self._lbKeoghEnvelopes = {}
+        self._knnGraph = None
+        self._subsequenceIndex = None
+        self._subsequenceIndexProcesed = True
         self.oldCoords = None
 
         
@@ -106,9 +128,14 @@ class MTSerieDataset:
         assert isinstance(mtserie, MTSerie)
         assert isinstance(identifier, str)
         
+        if identifier in self.mtseries:
+            self._invalidate_distance_matrix()
+        
         self.mtseries[identifier] = mtserie
         # * Added to procesed mtseries by reference
         self.procesedMTSeries[identifier] = mtserie
+        self._lbKeoghEnvelopes = {}
+        self._knnGraph = None
         
         if self._isDataUniformInVariables:
             self._isDataUniformInVariables = self.variablesLen == mtserie.variablesLen 
@@ -131,6 +158,89 @@ class MTSerieDataset:
         
         assert self.categoricalLabels == mtserie.categoricalLabels
         assert self.numericalLabels == mtserie.numericalLabels
+        
+        if self._subsequenceIndex is not None:
+            self._subsequenceIndex.add(mtserie, identifier)
+        
+        self._grow_distance_matrix()
+    
+    def remove(self, identifier):
+        """
+        Removes an mtserie from the dataset, the row and column of the cached 
+        distance matrixes are dropped instead of recomputing them.
+
+        Args:
+            identifier (str): identifier of the mtserie
+        """
+        pos = self.ids.index(identifier)
+        del self.mtseries[identifier]
+        del self.procesedMTSeries[identifier]
+        self._projections.pop(identifier, None)
+        self._lbKeoghEnvelopes = {}
+        self._knnGraph = None
+        if self._subsequenceIndex is not None:
+            self._subsequenceIndex.remove(identifier)
+        
+        if self._distanceMatrixFiles is not None:
+            self._invalidate_distance_matrix()
+        elif self._distanceMatrix_k is not None:
+            self._distanceMatrix_k = np.delete(np.delete(self._distanceMatrix_k, pos, axis=1), pos, axis=2)
+            self._distanceMatrix = np.delete(np.delete(self._distanceMatrix, pos, axis=0), pos, axis=1)
+        self._reset_squared_distance_matrixes()
+    
+    def _grow_distance_matrix(self):
+        """
+        Adds the row and column of the last added mtserie to the cached 
+        distance matrixes, only the distances to the new mtserie are computed.
+        """
+        if self._distanceMatrix_k is None and self._distanceMatrixFiles is None:
+            return
+        params = self._distanceParams
+        # * memory-mapped matrixes are not resized
+        if params is None or params['distanceType'] == DistanceType.PDIST or self._distanceMatrixFiles is not None:
+            self._invalidate_distance_matrix()
+            return
+        
+        mtseries = self.get_mtseries(procesed=params['procesed'])
+        N = len(mtseries) - 1
+        
+        D_ks = np.zeros([len(params['variables']), N + 1, N + 1])
+        D_ks[:, :N, :N] = self._distanceMatrix_k
+        for k, varName in enumerate(params['variables']):
+            distances = k_distances_to(mtseries[:N], mtseries[N], varName, 
+                                       params['distanceType'], window=params['window'])
+            D_ks[k, N, :N] = distances
+            D_ks[k, :N, N] = distances
+        
+        D = np.zeros([N + 1, N + 1])
+        D[:N, :N] = self._distanceMatrix
+        distances = combine_distance_matrixes(D_ks[:, N, :N], params['alphas'])
+        D[N, :N] = distances
+        D[:N, N] = distances
+        
+        self._distanceMatrix = D
+        self._distanceMatrix_k = D_ks
+        self._reset_squared_distance_matrixes()
+    
+    def _invalidate_distance_matrix(self):
+        self._distanceMatrix = None
+        self._distanceMatrix_k = None
+        self._distanceParams = None
+        self._distanceMatrixFiles = None
+        self._squaredDistanceMatrixes = {}
+    
+    def _open_distance_memmap(self, name, mode = 'r'):
+        files = self._distanceMatrixFiles
+        D, N = files['shape'][0], files['shape'][1]
+        shape = (D, N, N) if name == 'D_k' else (N, N)
+        return np.memmap(os.path.join(files['directory'], name + '.dat'), dtype=files['dtype'], mode=mode, shape=shape)
+    
+    def _reset_squared_distance_matrixes(self):
+        # * only the squares of the current matrixes are kept, a (D, N, N) copy per 
+        # * parameters would grow without bound
+        self._squaredDistanceMatrixes = {}
+        if self._distanceParams is not None and self._distanceMatrix_k is not None:
+            self._squaredDistanceMatrixes[self._distance_key()] = np.power(self._distanceMatrix_k, 2)
     
     
     
@@ -164,18 +274,30 @@ class MTSerieDataset:
             
         assert len(_alphas) == len(_variables)
     
+        # * the in-memory matrixes replace the ones of an earlier memory-mapped run
+        self._distanceMatrixFiles = None
         self._distanceMatrix, self._distanceMatrix_k = distance_matrix(
             self.get_mtseries(procesed=procesed), variables=_variables, 
             alphas=_alphas, distanceType=distanceType, L=L
             )
+        self._distanceParams = {'variables': _variables, 'alphas': _alphas, 'distanceType': distanceType, 
+                                'L': L, 'procesed': procesed, 'window': None}
+        self._reset_squared_distance_matrixes()
     
-    def compute_distance_matrix(self, variables = [], alphas = [], distanceType = DistanceType.EUCLIDEAN, L = 10, procesed = True):
+    def compute_distance_matrix(self, variables = [], alphas = [], distanceType = DistanceType.EUCLIDEAN, L = 10, procesed = True, window = None, n_jobs = 1,
+                                memmap_dir = None, block_size = 1024, dtype = np.float64):
         '''
         Implementation of distance matrix defined in "Interactive visualization of multivariate time series data"
 
         Args:
             distanceType (DistanceType, optional): Distance to compare mtseries. Defaults to DistanceType.EUCLIDEAN.
             L (int, optional): Window size used for MPdist. Defaults to 10.
+            window (int, optional): Sakoe-Chiba band radius used for DTW. Defaults to None.
+            n_jobs (int, optional): Number of processes used for DTW and MPdist, -1 to use all CPU cores. Defaults to 1.
+            memmap_dir (str, optional): If given, the matrixes are computed by blocks and written to 
+                memory-mapped files in this directory, [distanceMatrix] and [distanceMatrix_k] open them lazily. Defaults to None.
+            block_size (int, optional): Tile size of the memory-mapped computation. Defaults to 1024.
+            dtype (np.dtype, optional): dtype of the memory-mapped matrixes. Defaults to np.float64.
         '''
         _variables = variables
         if len(variables) == 0: 
@@ -185,12 +307,305 @@ class MTSerieDataset:
         if len(alphas) == 0:
             _alphas = np.ones(len(_variables))
         assert len(_alphas) == len(_variables)
+        # * checked before any state changes, so a rejected call keeps the current matrixes
+        if memmap_dir is not None and distanceType not in (DistanceType.EUCLIDEAN, DistanceType.DTW):
+            raise ValueError("Unsupported distance type for memory-mapped matrixes")
+        
+        self._distanceMatrixFiles = None
+        self._distanceParams = {'variables': _variables, 'alphas': _alphas, 'distanceType': distanceType, 
+                                'L': L, 'procesed': procesed, 'window': window}
+        
+        if memmap_dir is not None:
+            self._distanceMatrix = None
+            self._distanceMatrix_k = None
+            self._squaredDistanceMatrixes = {}
+            _, D_ks = blocked_distance_matrix(
+                self.get_mtseries(procesed=procesed), _variables, _alphas, memmap_dir, 
+                distanceType=distanceType, block_size=block_size, dtype=dtype, window=window
+                )
+            self._distanceMatrixFiles = {'directory': memmap_dir, 'shape': D_ks.shape, 'dtype': dtype, 'block_size': block_size}
+            return
+        
+        key = self._distance_key()
+        
+        # * the per variable distances do not depend on the alphas, the ones of the 
+        # * last call are reused when only the alphas change
+        if key in self._squaredDistanceMatrixes:
+            self.reweight(_alphas)
+            return
     
         self._distanceMatrix, self._distanceMatrix_k = distance_matrix(
             self.get_mtseries(procesed=procesed), variables=_variables, 
-            alphas=_alphas, distanceType=distanceType, L=L
+            alphas=_alphas, distanceType=distanceType, L=L, window=window, n_jobs=n_jobs
+            )
+        self._reset_squared_distance_matrixes()
+    
+    def reweight(self, alphas):
+        '''
+        Recombines the cached per variable distance matrixes of the last 
+        [compute_distance_matrix] call with new weights as 
+        sqrt(sum_k alphas_k^2 * D_k^2), no distance is recomputed.
+
+        Args:
+            alphas (List of float): weigth for each variable used in the last [compute_distance_matrix]
+
+        Returns:
+            np.ndarray: combined distance matrix
+        '''
+        assert self._distanceParams is not None
+        assert len(alphas) == len(self._distanceParams['variables'])
+        
+        if self._distanceMatrixFiles is not None:
+            self._distanceMatrix = blocked_reweight(
+                self._open_distance_memmap('D_k'), alphas, self._open_distance_memmap('D', mode='r+'), 
+                block_size=self._distanceMatrixFiles['block_size']
+                )
+            self._distanceParams['alphas'] = alphas
+            return self._distanceMatrix
+        
+        D_ks_sq = self._squaredDistanceMatrixes[self._distance_key()]
+        self._distanceMatrix = np.sqrt(np.tensordot(np.power(alphas, 2), D_ks_sq, axes=1))
+        self._distanceParams['alphas'] = alphas
+        return self._distanceMatrix
+    
+    def _distance_key(self):
+        params = self._distanceParams
+        return (tuple(params['variables']), params['distanceType'], params['L'], params['procesed'], params['window'])
+    
+    def compute_knn_graph(self, k, variables = [], alphas = [], distanceType = DistanceType.EUCLIDEAN, procesed = True, window = None, random_state = None):
+        '''
+        Approximate k nearest neighbors graph under the same combined distance of
+        [compute_distance_matrix], its memory and time grow with N * k instead of N^2.
+        The graph can be given to [compute_projection] and [cluster_knn_graph].
+
+        Args:
+            k (int): number of neighbors
+            distanceType (DistanceType, optional): Distance to compare mtseries. Defaults to DistanceType.EUCLIDEAN.
+            window (int, optional): Sakoe-Chiba band radius used for DTW. Defaults to None.
+            random_state (int, optional): seed of the NN-descent initialization. Defaults to None.
+
+        Returns:
+            scipy.sparse.csr_matrix: (N, N) distances to the neighbors of each mtserie, in [ids] order
+        '''
+        _variables = variables
+        if len(variables) == 0: 
+            _variables = self.temporalVariables
+        
+        _alphas = alphas
+        if len(alphas) == 0:
+            _alphas = np.ones(len(_variables))
+        assert len(_alphas) == len(_variables)
+        
+        self._knnGraph = knn_graph(
+            self.get_mtseries(procesed=procesed), k, _variables, _alphas, 
+            distanceType=distanceType, window=window, random_state=random_state
+            )
+        return self._knnGraph
+    
+    def get_dtw_neighbors(self, id, k, variables = [], alphas = [], window = None, procesed = True):
+        '''
+        Gets the k nearest neighbors of an mtserie under the combined DTW distance,
+        pruning candidates with LB_Keogh. The envelopes are kept between calls.
+
+        Args:
+            id (str): identifier of the query mtserie
+            k (int): number of neighbors
+            window (int, optional): Sakoe-Chiba band radius. Defaults to None.
+
+        Returns:
+            (list, np.ndarray): ids of the neighbors and their distances
+        '''
+        _variables = variables
+        if len(variables) == 0: 
+            _variables = self.temporalVariables
+        
+        _alphas = alphas
+        if len(alphas) == 0:
+            _alphas = np.ones(len(_variables))
+        assert len(_alphas) == len(_variables)
+        
+        mtseries = self.get_mtseries(procesed=procesed)
+        key = (tuple(_variables), window, procesed)
+        if key not in self._lbKeoghEnvelopes:
+            self._lbKeoghEnvelopes[key] = [lb_keogh_envelopes(stack_variable(mtseries, varName), window) for varName in _variables]
+        
+        neighbors, distances = dtw_nearest_neighbors(
+            mtseries, self.ids.index(id), k, _variables, _alphas, 
+            window=window, envelopes=self._lbKeoghEnvelopes[key]
             )
+        return [self.ids[i] for i in neighbors], distances
     
+    def build_subsequence_index(self, variables = [], procesed = True):
+        """
+        Builds the similarity search index over the mtseries, it is kept up to 
+        date by add, remove and downsample_data
+
+        Args:
+            variables (List of str, optional): variables to index. Defaults to all temporal variables.
+            procesed (bool, optional): index the procesed mtseries. Defaults to True.
+        """
+        _variables = variables
+        if len(variables) == 0: 
+            _variables = self.temporalVariables
+        
+        index = SubsequenceIndex(_variables)
+        for identifier, mtserie in zip(self.ids, self.get_mtseries(procesed=procesed)):
+            index.add(mtserie, identifier)
+        self._subsequenceIndex = index
+        self._subsequenceIndexProcesed = procesed
+        return index
+    
+    def search_subsequences(self, query, k = 10, variables = [], exclusion_zone = None, n_jobs = 1):
+        """
+        Finds where a pattern occurs across all the mtseries and variables, the
+        index is built on the procesed mtseries on the first call
+
+        Args:
+            query (np.ndarray): pattern to search
+            k (int, optional): number of matches. Defaults to 10.
+            variables (List of str, optional): variables to search. Defaults to all indexed variables.
+            exclusion_zone (int, optional): minimum separation between matches in the same serie. Defaults to len(query) / 2.
+            n_jobs (int, optional): number of threads, -1 to use all CPU cores. Defaults to 1.
+
+        Returns:
+            List of (str, str, int, float): (id, variable, position, distance) sorted by distance
+        """
+        if self._subsequenceIndex is None:
+            self.build_subsequence_index()
+        return self._subsequenceIndex.search(query, k=k, variables=variables, 
+                                             exclusion_zone=exclusion_zone, n_jobs=n_jobs)
+    
+    def compute_matrix_profiles(self, L, algorithm = 'stomp', n_jobs = 1, variables = [], procesed = True, 
+                                runtime = None, progress = None, cancel = None):
+        """
+        Computes the matrix profile of every (mtserie, variable) pair with a pool of 
+        processes, the results are stored in the mp of each mtserie
+
+        Args:
+            L (int): window size
+            algorithm (str, optional): 'stomp' or 'scrimp++'. Defaults to 'stomp'.
+            n_jobs (int, optional): number of processes, -1 to use all CPU cores. Defaults to 1.
+            variables (List of str, optional): variables to use. Defaults to all temporal variables.
+            procesed (bool, optional): use the procesed mtseries. Defaults to True.
+            runtime (int, optional): maximum seconds of each SCRIMP++ job. Defaults to None.
+            progress (function, optional): called as progress(done, total) after each job. Defaults to None.
+            cancel (threading.Event, optional): pending jobs are dropped once it is set. Defaults to None.
+
+        Returns:
+            bool: False if the computation was cancelled before every job finished, 
+            the mtseries with unfinished variables are left unchanged
+        """
+        _variables = variables
+        if len(variables) == 0: 
+            _variables = self.temporalVariables
+        
+        mtseries = dict(zip(self.ids, self.get_mtseries(procesed=procesed)))
+        jobs = [((id, varName), mtserie.get_serie(varName)) for id, mtserie in mtseries.items() 
+                for varName in _variables if mtserie.timeLen >= L]
+        
+        # * profiles of a mtserie are stored together with its window size once all its variables finish
+        pending = {}
+        for (id, _), _ in jobs:
+            pending[id] = pending.get(id, 0) + 1
+        profiles = {id: {} for id in pending}
+        
+        done = 0
+        for (id, varName), profile in matrix_profiles(jobs, L, algorithm=algorithm, n_jobs=n_jobs, runtime=runtime, 
+                                                      progress=progress, cancel=cancel):
+            profiles[id][varName] = profile
+            if len(profiles[id]) == pending[id]:
+                mtseries[id].mp.update(profiles[id])
+                mtseries[id].mp_window_size = L
+            done = done + 1
+        return done == len(jobs)
+    
+    def compute_pan_matrix_profiles(self, windows, n_jobs = 1, variables = [], procesed = True):
+        """
+        Computes the pan matrix profile, the matrix profiles for a range of window 
+        sizes, of every (mtserie, variable) pair, stored in the pmp of each mtserie
+
+        Args:
+            windows (List of int): window sizes, e.g. range(minL, maxL + 1)
+            n_jobs (int, optional): number of processes, -1 to use all CPU cores. Defaults to 1.
+            variables (List of str, optional): variables to use. Defaults to all temporal variables.
+            procesed (bool, optional): use the procesed mtseries. Defaults to True.
+        """
+        _variables = variables
+        if len(variables) == 0: 
+            _variables = self.temporalVariables
+        
+        windows = list(windows)
+        mtseries = dict(zip(self.ids, self.get_mtseries(procesed=procesed)))
+        jobs = [((id, varName), mtserie.get_serie(varName)) for id, mtserie in mtseries.items() 
+                for varName in _variables if mtserie.timeLen >= max(windows)]
+        
+        for (id, varName), profile in pan_matrix_profiles(jobs, windows, n_jobs=n_jobs).items():
+            mtseries[id].pmp[varName] = profile
+    
+    def get_motifs(self, maxMotifs = 8, variables = [], procesed = True, n_jobs = 1):
+        """
+        Top motifs of every (mtserie, variable) pair with a computed matrix profile
+
+        Args:
+            maxMotifs (int, optional): maximum number of motifs of each serie. Defaults to 8.
+            variables (List of str, optional): variables to use. Defaults to all temporal variables.
+            procesed (bool, optional): use the procesed mtseries. Defaults to True.
+            n_jobs (int, optional): number of processes, -1 to use all CPU cores. Defaults to 1.
+
+        Returns:
+            dict: (motifs, distances) of each (id, variable)
+        """
+        _variables = variables
+        if len(variables) == 0: 
+            _variables = self.temporalVariables
+        
+        jobs = [((id, varName), mtserie.get_serie(varName), mtserie.mp[varName]) 
+                for id, mtserie in zip(self.ids, self.get_mtseries(procesed=procesed)) 
+                for varName in _variables if varName in mtserie.mp]
+        return series_motifs(jobs, max_motifs=maxMotifs, n_jobs=n_jobs)
+    
+    def get_top_discords(self, k = 10, variables = [], procesed = True, ex_zone = None):
+        """
+        Ranks the top discords across all the mtseries and variables with a 
+        computed matrix profile. The profiles are concatenated, separated by gaps 
+        longer than the exclusion zone, and searched at once
+
+        Args:
+            k (int, optional): number of discords. Defaults to 10.
+            variables (List of str, optional): variables to use. Defaults to all temporal variables.
+            procesed (bool, optional): use the procesed mtseries. Defaults to True.
+            ex_zone (int, optional): samples excluded on either side of a discord. Defaults to the largest window size.
+
+        Returns:
+            List of (str, str, int, float): (id, variable, position, matrix profile value) sorted by value
+        """
+        _variables = variables
+        if len(variables) == 0: 
+            _variables = self.temporalVariables
+        
+        keys = []
+        profiles = []
+        for id, mtserie in zip(self.ids, self.get_mtseries(procesed=procesed)):
+            for varName in _variables:
+                if varName in mtserie.mp:
+                    keys.append((id, varName, mtserie.mp_window_size))
+                    profiles.append(mtserie.mp[varName][0])
+        if len(profiles) == 0:
+            return []
+        
+        if ex_zone is None:
+            ex_zone = max(windowSize for _, _, windowSize in keys)
+        
+        gap = np.full(ex_zone, np.nan)
+        lengths = np.array([len(profile) for profile in profiles])
+        starts = np.concatenate([[0], np.cumsum(lengths + ex_zone)[:-1]])
+        flat = np.concatenate([part for profile in profiles for part in (profile, gap)])
+        
+        found = discords(flat, ex_zone, k=k)
+        found = found[found < len(flat)]
+        series = np.searchsorted(starts, found, side='right') - 1
+        return [(keys[s][0], keys[s][1], int(position - starts[s]), float(flat[position])) 
+                for s, position in zip(series, found)]
     
     # def compute_projection(self):
     #     coords = mds_projection(self._distanceMatrix)
@@ -198,13 +613,21 @@ class MTSerieDataset:
     #         self._projections[self.ids[i]] = coords[i]
             
     def compute_projection(self, D):
-        coords = mds_projection(D)
+        if sparse.issparse(D):
+            coords = knn_projection(D)
+        else:
+            coords = mds_projection(D)
         for i in range(self.instanceLen):
             self._projections[self.ids[i]] = coords[i]
             
     def downsample_data(self, rule):
         for i in range(self.instanceLen):
             self.procesedMTSeries[self.ids[i]] = self.mtseries[self.ids[i]].resample(rule)
+        self._lbKeoghEnvelopes = {}
+        self._knnGraph = None
+        if self._subsequenceIndex is not None and self._subsequenceIndexProcesed:
+            self.build_subsequence_index(self._subsequenceIndex.variables, procesed=True)
+        self._invalidate_distance_matrix()
             
     def cluster_projections(self, n_clusters, coords):
         coords = np.array(list(self._projections.values()))
@@ -237,6 +660,32 @@ class MTSerieDataset:
             clusters[clusterLabel] = clusterIds
         return clusters
 
+    
+    def cluster_knn_graph(self, n_clusters, G = None):
+        '''
+        Spectral clustering of the mtseries using a k nearest neighbors graph
+
+        Args:
+            n_clusters (int): number of clusters
+            G (scipy.sparse.csr_matrix, optional): neighbors graph, the one of the last [compute_knn_graph] if None. Defaults to None.
+
+        Returns:
+            dict: ids of the mtseries of each cluster label
+        '''
+        if G is None:
+            G = self._knnGraph
+        assert G is not None
+        
+        # * sklearn counts the sample itself as one of the neighbors of the graph
+        k = int(np.min(np.diff(G.indptr))) - 1
+        clustering = SpectralClustering(n_clusters=n_clusters, affinity="precomputed_nearest_neighbors", 
+                                        n_neighbors=k, random_state=0)
+        labels = clustering.fit_predict(G)
+        
+        clusters = {}
+        for clusterLabel in np.unique(labels):
+            clusters[clusterLabel] = [self.ids[i] for i in np.flatnonzero(labels == clusterLabel)]
+        return clusters
         
     # def cluster_projections(self, n_clusters):
     #     coords = np.array(list(self._projections.values()))
@@ -346,6 +795,10 @@ class MTSerieDataset:
         for mtserie in self.get_mtseries(procesed=True):
             assert isinstance(mtserie, MTSerie)
             mtserie.remove_serie(varName)
+        self._lbKeoghEnvelopes = {}
+        self._knnGraph = None
+        self._subsequenceIndex = None
+        self._invalidate_distance_matrix()
     
     def values(self, procesed=True)-> np.ndarray:
         assert self._isDataUniformInTime
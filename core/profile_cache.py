@@ -0,0 +1,139 @@
+import os
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+
+class ProfileCache:
+    """summary for [ProfileCache]
+
+        Matrix profiles stored on disk as .npy files, keyed by the hash of
+        the serie values, the window size and the algorithm. Once the files
+        exceed maxBytes the least recently used profiles are removed. The
+        size and recency of every entry are tracked in memory, the directory
+        is only listed when the cache is opened or on [evict].
+    """
+    def __init__(self, directory, maxBytes = 1 << 30):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def key(self, ts, L, algorithm) -> str:
+        ts = np.ascontiguousarray(ts, dtype=np.float64)
+        digest = hashlib.sha1(ts.view(np.uint8)).hexdigest()
+        return '{}_{}_{}_{}'.format(digest, len(ts), L, algorithm.replace('+', 'p'))
+
+    def _paths(self, key):
+        return (os.path.join(self.directory, key + '_mp.npy'),
+                os.path.join(self.directory, key + '_index.npy'))
+
+    def _scan(self):
+        # * entries ordered from least to most recently used
+        entries = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npy'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            key = name.rsplit('_', 1)[0]
+            size, mtime = entries.get(key, (0, 0))
+            entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+        self._entries = OrderedDict((key, entries[key][0]) for key in sorted(entries, key=lambda key: entries[key][1]))
+        self._totalBytes = sum(self._entries.values())
+
+    def _entry_size(self, key):
+        size = 0
+        for path in self._paths(key):
+            try:
+                size = size + os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    def _track(self, key, size):
+        self._totalBytes = self._totalBytes - self._entries.pop(key, 0) + size
+        self._entries[key] = size
+
+    def get(self, ts, L, algorithm):
+        """
+        Cached (profile, index) of the serie, None if it is not cached
+        """
+        key = self.key(ts, L, algorithm)
+        mpPath, indexPath = self._paths(key)
+        try:
+            profile = (np.load(mpPath), np.load(indexPath))
+        except (OSError, ValueError):
+            return None
+        # * the modification time orders the eviction of later sessions
+        for path in (mpPath, indexPath):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        else:
+            # * written by another process
+            self._track(key, self._entry_size(key))
+        return profile
+
+    def put(self, ts, L, algorithm, profile):
+        key = self.key(ts, L, algorithm)
+        size = 0
+        for path, values in zip(self._paths(key), profile):
+            # * written to a temporary file first, so readers never see partial profiles
+            tmpPath = path + '.{}.tmp'.format(os.getpid())
+            with open(tmpPath, 'wb') as f:
+                np.save(f, np.asarray(values))
+                size = size + f.tell()
+            os.replace(tmpPath, path)
+        self._track(key, size)
+        if self._totalBytes > self.maxBytes:
+            self._evict_lru()
+
+    def _evict_lru(self):
+        while self._totalBytes > self.maxBytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._totalBytes = self._totalBytes - size
+
+    def evict(self):
+        """
+        Lists the directory again, including files written by other processes, and
+        removes the least recently used profiles until the cache fits in maxBytes
+        """
+        self._scan()
+        self._evict_lru()
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy'):
+                os.remove(os.path.join(self.directory, name))
+        self._entries = OrderedDict()
+        self._totalBytes = 0
+
+
+_profileCache = None
+
+def set_profile_cache(directory, maxBytes = 1 << 30):
+    """
+    Enables the on-disk matrix profile cache used by compute_matrix_profile and
+    compute_matrix_profiles, None disables it
+
+    Args:
+        directory (str): cache directory
+        maxBytes (int, optional): maximum size of the cached files. Defaults to 1 GiB.
+    """
+    global _profileCache
+    _profileCache = None if directory is None else ProfileCache(directory, maxBytes)
+    return _profileCache
+
+def get_profile_cache() -> ProfileCache:
+    return _profileCache
@@ -1,28 +1,23 @@
+import os
 import numpy as np
+from functools import partial
 from numpy.core.fromnumeric import var
 from sklearn import manifold
+from scipy.spatial.distance import squareform
 from .mtserie import MTSerie
-from .distances import ts_euclidean_distance, ts_dtw_distance, ts_mp_distance, DistanceType
+from .distances import ts_euclidean_distance, ts_dtw_distance, ts_mp_distance, lb_keogh_envelopes, lb_keogh, DistanceType
 from .matrix_profile import mp_distance_matrix
+from .utils import pairwise_condensed
 
 
 def compute_k_distance_matrixes(mtseries, variables = [], distanceType = DistanceType.EUCLIDEAN, L = 10):
     # todo restore mpdist, maybe
     # if distanceType == DistanceType.PDIST:
     #     return mp_distance_matrix(mtseries, variables, alphas, L, 8)
-    N = len(mtseries)
     # * assumes all mtseries are even and aligned
     D_k = {}
     for varName in variables:
-        D_k[varName] = np.zeros([N, N])
-        for i in range(N):
-            for j in range(N):
-                assert isinstance(mtseries[i], MTSerie)
-                if distanceType == DistanceType.EUCLIDEAN:
-                    D_k[varName][i][j] = ts_euclidean_distance(mtseries[i].get_serie(varName), mtseries[j].get_serie(varName))
-                elif distanceType == DistanceType.DTW:
-                    D_k[varName][i][j] = ts_dtw_distance(mtseries[i].get_serie(varName), mtseries[j].get_serie(varName))
-        D_k[varName] = np.power(D_k[varName], 2)
+        D_k[varName] = squareform(np.power(k_condensed_distances(mtseries, varName, distanceType), 2))
     return D_k
     
 
@@ -34,55 +29,186 @@ def compute_distance_matrix(D_k,alphas,N):
     return D
 
 
-def distance_matrix(mtseries, variables = [], alphas = [], distanceType = DistanceType.EUCLIDEAN, L = 10):
+def stack_variable(mtseries, varName):
+    """
+    Stacks the values of one variable of every mtserie into a single array
+
+    Args:
+        mtseries (List of MTSerie): Multivariate time series list
+        varName (str): Time dependent variable to stack
+
+    Returns:
+        np.ndarray: (N, T) array, or None if the series are uneven
+    """
+    series = [mtserie.get_serie(varName) for mtserie in mtseries]
+    if len(set(len(serie) for serie in series)) > 1:
+        return None
+    return np.array(series, dtype=float)
+
+def gram_euclidean_distance_matrix(X, rtol = 1e-8):
+    """
+    Pairwise euclidean distances between the rows of X using the Gram matrix
+    identity ||a||^2 + ||b||^2 - 2a.b, so that all the dot products are computed
+    with a single matrix multiplication.
+    
+    The identity loses precision when two rows are close relative to their norms, 
+    those pairs are recomputed with the exact difference.
+
+    Args:
+        X (np.ndarray): (N, T) array with one serie per row
+        rtol (float, optional): relative tolerance used to detect ill-conditioned pairs. Defaults to 1e-8.
+
+    Returns:
+        np.ndarray: (N, N) distance matrix
+    """
+    sqNorms = np.einsum('ij,ij->i', X, X)
+    D_sq = sqNorms[:, np.newaxis] + sqNorms[np.newaxis, :] - 2 * (X @ X.T)
+    
+    # * cancellation error of the identity is proportional to the norms
+    illConditioned = D_sq <= rtol * (sqNorms[:, np.newaxis] + sqNorms[np.newaxis, :])
+    np.fill_diagonal(illConditioned, False)
+    for i, j in zip(*np.nonzero(np.triu(illConditioned))):
+        D_sq[i, j] = D_sq[j, i] = np.sum((X[i] - X[j]) ** 2)
+    
+    np.maximum(D_sq, 0, out=D_sq)
+    np.fill_diagonal(D_sq, 0)
+    return np.sqrt(D_sq)
+
+def gram_euclidean_distances(X_A, X_B, rtol = 1e-8):
+    """
+    Euclidean distances between the rows of X_A and the rows of X_B using the 
+    Gram matrix identity, see [gram_euclidean_distance_matrix]
+
+    Args:
+        X_A (np.ndarray): (N_A, T) array with one serie per row
+        X_B (np.ndarray): (N_B, T) array with one serie per row
+        rtol (float, optional): relative tolerance used to detect ill-conditioned pairs. Defaults to 1e-8.
+
+    Returns:
+        np.ndarray: (N_A, N_B) distances
+    """
+    sqNorms_A = np.einsum('ij,ij->i', X_A, X_A)
+    sqNorms_B = np.einsum('ij,ij->i', X_B, X_B)
+    D_sq = sqNorms_A[:, np.newaxis] + sqNorms_B[np.newaxis, :] - 2 * (X_A @ X_B.T)
+    
+    illConditioned = D_sq <= rtol * (sqNorms_A[:, np.newaxis] + sqNorms_B[np.newaxis, :])
+    for i, j in zip(*np.nonzero(illConditioned)):
+        D_sq[i, j] = np.sum((X_A[i] - X_B[j]) ** 2)
+    
+    np.maximum(D_sq, 0, out=D_sq)
+    return np.sqrt(D_sq)
+
+def k_condensed_distances(mtseries, varName, distanceType = DistanceType.EUCLIDEAN, window = None, n_jobs = 1):
+    """
+    Gets the condensed distance matrix of a single variable of the mtseries
+
+    Args:
+        mtseries (List of MTSerie): Multivariate time series list
+        varName (str): Time dependent variable to use
+        distanceType (DistanceType, optional): Distance to compare the series. Defaults to DistanceType.EUCLIDEAN.
+        window (int, optional): Sakoe-Chiba band radius used by DTW. Defaults to None.
+        n_jobs (int, optional): number of processes used by DTW. Defaults to 1.
+
+    Returns:
+        np.ndarray: condensed distance matrix
+    """
+    if distanceType == DistanceType.EUCLIDEAN:
+        X = stack_variable(mtseries, varName)
+        if X is not None:
+            return squareform(gram_euclidean_distance_matrix(X), checks=False)
+        metric = ts_euclidean_distance
+    elif distanceType == DistanceType.DTW:
+        metric = partial(ts_dtw_distance, window=window)
+    else:
+        raise ValueError("Unsupported distance type")
+    
+    for mtserie in mtseries:
+        assert isinstance(mtserie, MTSerie)
+    return pairwise_condensed([mtserie.get_serie(varName) for mtserie in mtseries], metric, n_jobs=n_jobs)
+
+def k_distances_to(mtseries, mtserie, varName, distanceType = DistanceType.EUCLIDEAN, window = None):
+    """
+    Gets the distances between a single variable of mtserie and the same variable 
+    of every mtserie in mtseries
+
+    Args:
+        mtseries (List of MTSerie): Multivariate time series list
+        mtserie (MTSerie): Multivariate time serie to compare
+        varName (str): Time dependent variable to use
+        distanceType (DistanceType, optional): Distance to compare the series. Defaults to DistanceType.EUCLIDEAN.
+        window (int, optional): Sakoe-Chiba band radius used by DTW. Defaults to None.
+
+    Returns:
+        np.ndarray: distance to each mtserie of mtseries
+    """
+    assert isinstance(mtserie, MTSerie)
+    serie = mtserie.get_serie(varName)
+    if distanceType == DistanceType.EUCLIDEAN:
+        X = stack_variable(mtseries, varName)
+        if X is not None and X.shape[1] == len(serie):
+            return np.linalg.norm(X - serie, axis=1)
+        metric = ts_euclidean_distance
+    elif distanceType == DistanceType.DTW:
+        metric = partial(ts_dtw_distance, window=window)
+    else:
+        raise ValueError("Unsupported distance type")
+    return np.array([metric(serie, other.get_serie(varName)) for other in mtseries])
+
+def combine_distance_matrixes(D_ks, alphas):
+    """
+    Combines per variable distance matrixes as sqrt(sum_k alpha_k^2 * D_k^2)
+
+    Args:
+        D_ks (np.ndarray): per variable distance matrixes, square or condensed, stacked on the first axis
+        alphas (List of float): weigth for each variable
+
+    Returns:
+        np.ndarray: combined distance matrix with the same shape of each D_k
+    """
+    D = np.zeros(D_ks.shape[1:])
+    for k in range(len(D_ks)):
+        D = D + np.power(D_ks[k], 2) * (alphas[k] ** 2)
+    return np.power(D, 1/2)
+
+def distance_matrix(mtseries, variables = [], alphas = [], distanceType = DistanceType.EUCLIDEAN, L = 10, condensed = False, window = None, n_jobs = 1):
     """
     Gets Distance Matrix of multivariate time series using euclidean distance on the selected variables and using the provided alphas
+    
+    Only the pairs i < j are computed, the square matrixes are expanded from the 
+    condensed ones unless [condensed] is True.
 
     Args:
         mtseries (List of MTSerie): Multivariate time series list
         variables (List of str): Time dependent variables to use
         alphas (List of float): weigth for each variable
+        condensed (bool, optional): return condensed matrixes. Defaults to False.
+        window (int, optional): Sakoe-Chiba band radius used by DTW. Defaults to None.
+        n_jobs (int, optional): number of processes used by DTW and MPdist. Defaults to 1.
 
     Returns:
-        [type]: [description]
+        (np.ndarray, np.ndarray): combined distance matrix and per variable distance matrixes
     """
     assert len(variables) == len(alphas)
     
-    # todo add jobs arguments
     if distanceType == DistanceType.PDIST:
-        return mp_distance_matrix(mtseries, variables, alphas, L, 8)
+        return mp_distance_matrix(mtseries, variables, alphas, L, n_jobs, condensed=condensed)
     
     N = len(mtseries)
     
     # * assumes all mtseries are even and aligned
     D = len(variables)
-    T = mtseries[0].timeLen
-    
-    D_k = np.zeros([D, N, N])
     
+    D_ks = np.zeros([D, N * (N - 1) // 2])
     for k in range(D):
-        varName = variables[k]
-        for i in range(N):
-            for j in range(N):
-                assert isinstance(mtseries[i], MTSerie)
-                if distanceType == DistanceType.EUCLIDEAN:
-                    D_k[k][i][j] = ts_euclidean_distance(mtseries[i].get_serie(varName), mtseries[j].get_serie(varName))
-                elif distanceType == DistanceType.DTW:
-                    D_k[k][i][j] = ts_dtw_distance(mtseries[i].get_serie(varName), mtseries[j].get_serie(varName))
-                
-                #todo remove
-                # elif distanceType == DistanceType.PDIST:
-                #     D_k[k][i][j] = ts_mp_distance(mtseries[i].get_serie(varName), mtseries[j].get_serie(varName), L)
-    D_ks =  np.copy(D_k)
+        D_ks[k] = k_condensed_distances(mtseries, variables[k], distanceType, window=window, n_jobs=n_jobs)
     
-    for k in range(D):
-        D_k[k] = np.power(D_k[k], 2) * (alphas[k] ** 2)
-    D = np.sum(D_k, axis=0)
-    D = np.power(D, 1/2)
+    D = combine_distance_matrixes(D_ks, alphas)
     
-    return D, D_ks
+    if condensed:
+        return D, D_ks
+    return squareform(D), np.array([squareform(D_k) for D_k in D_ks])
 
-def euclidean_distance_matrix(mtseries, variables, alphas):
+def euclidean_distance_matrix(mtseries, variables, alphas, condensed = False):
     """
     Gets Distance Matrix of multivariate time series using euclidean distance on the selected variables and using the provided alphas
 
@@ -90,74 +216,176 @@ def euclidean_distance_matrix(mtseries, variables, alphas):
         mtseries (List of MTSerie): Multivariate time series list
         variables (List of str): Time dependent variables to use
         alphas (List of float): weigth for each variable
+        condensed (bool, optional): return condensed matrixes. Defaults to False.
 
     Returns:
-        [type]: [description]
+        (np.ndarray, np.ndarray): combined distance matrix and per variable distance matrixes
     """
-    assert len(variables) == len(alphas)
+    return distance_matrix(mtseries, variables, alphas, distanceType=DistanceType.EUCLIDEAN, condensed=condensed)
+
+def dtw_distance_matrix(mtseries, variables, alphas, condensed = False, window = None, n_jobs = 1):
+    """
+    Gets Distance Matrix of multivariate time series using dtw distance on the selected variables and using the provided alphas
+
+    Args:
+        mtseries (List of MTSerie): Multivariate time series list
+        variables (List of str): Time dependent variables to use
+        alphas (List of float): weigth for each variable
+        condensed (bool, optional): return condensed matrixes. Defaults to False.
+        window (int, optional): Sakoe-Chiba band radius. Defaults to None.
+        n_jobs (int, optional): number of processes, -1 to use all CPU cores. Defaults to 1.
+
+    Returns:
+        (np.ndarray, np.ndarray): combined distance matrix and per variable distance matrixes
+    """
+    return distance_matrix(mtseries, variables, alphas, distanceType=DistanceType.DTW, condensed=condensed, window=window, n_jobs=n_jobs)
+
+def dtw_nearest_neighbors(mtseries, queryIndex, k, variables, alphas, window = None, envelopes = None):
+    """
+    Gets the k nearest neighbors of an mtserie under the combined dtw distance 
+    sqrt(sum_k alpha_k^2 * dtw_k^2).
     
+    The LB_Keogh bound of every candidate is computed first, candidates are
+    visited by increasing bound and the full DTW is skipped once the bound 
+    exceeds the current k-th best distance.
+
+    Args:
+        mtseries (List of MTSerie): Multivariate time series list, assumed even
+        queryIndex (int): position of the query mtserie in mtseries
+        k (int): number of neighbors
+        variables (List of str): Time dependent variables to use
+        alphas (List of float): weigth for each variable
+        window (int, optional): Sakoe-Chiba band radius. Defaults to None.
+        envelopes (List of (np.ndarray, np.ndarray), optional): precomputed lb_keogh_envelopes 
+            of each variable for the same window. Defaults to None.
+
+    Returns:
+        (np.ndarray, np.ndarray): positions of the neighbors and their distances, sorted by distance
+    """
+    assert len(variables) == len(alphas)
     N = len(mtseries)
     
-    # * assumes all mtseries are even and aligned
-    D = len(variables)
-    T = mtseries[0].timeLen
-    
-    D_k = np.zeros([D, N, N])
+    series = [stack_variable(mtseries, varName) for varName in variables]
+    for X in series:
+        assert X is not None
     
-    for k in range(D):
-        varName = variables[k]
-        for i in range(N):
-            for j in range(N):
-                assert isinstance(mtseries[i], MTSerie)
-                # TODO: maybe normalize
-                D_k[k][i][j] = ts_euclidean_distance(mtseries[i].get_serie(varName), mtseries[j].get_serie(varName))
-    
-    D_ks =  np.copy(D_k)
+    if envelopes is None:
+        envelopes = [lb_keogh_envelopes(X, window) for X in series]
     
-    for k in range(D):
-        D_k[k] = np.power(D_k[k], 2) * (alphas[k] ** 2)
-    D = np.sum(D_k, axis=0)
-    D = np.power(D, 1/2)
+    lowerBounds = np.zeros(N)
+    for X, alpha, (upper, lower) in zip(series, alphas, envelopes):
+        lowerBounds = lowerBounds + (alpha ** 2) * lb_keogh(X[queryIndex], upper, lower) ** 2
+    lowerBounds = np.sqrt(lowerBounds)
+    lowerBounds[queryIndex] = np.inf
     
-    return D, D_ks
+    neighbors = []
+    distances = []
+    for j in np.argsort(lowerBounds):
+        if j == queryIndex:
+            continue
+        if len(distances) >= k and lowerBounds[j] >= distances[-1]:
+            break
+        distance = 0
+        for X, alpha in zip(series, alphas):
+            distance = distance + (alpha ** 2) * ts_dtw_distance(X[queryIndex], X[j], window) ** 2
+        distance = np.sqrt(distance)
+        pos = np.searchsorted(distances, distance)
+        distances.insert(pos, distance)
+        neighbors.insert(pos, j)
+        distances = distances[:k]
+        neighbors = neighbors[:k]
+    return np.array(neighbors, dtype=int), np.array(distances)
 
-def dtw_distance_matrix(mtseries, variables, alphas):
+def blocked_distance_matrix(mtseries, variables, alphas, directory, distanceType = DistanceType.EUCLIDEAN, 
+                            block_size = 1024, dtype = np.float64, window = None):
     """
-    Gets Distance Matrix of multivariate time series using dtw distance on the selected variables and using the provided alphas
+    Out-of-core version of [distance_matrix]. The matrixes are computed by tiles of 
+    block_size x block_size pairs and written to memory-mapped files, so only the 
+    series and a few tiles are kept in memory.
+    
+    The files D.dat with shape (N, N) and D_k.dat with shape (len(variables), N, N)
+    are created in directory.
 
     Args:
         mtseries (List of MTSerie): Multivariate time series list
         variables (List of str): Time dependent variables to use
         alphas (List of float): weigth for each variable
+        directory (str): directory of the memory-mapped files
+        distanceType (DistanceType, optional): Distance to compare mtseries. Defaults to DistanceType.EUCLIDEAN.
+        block_size (int, optional): number of rows and columns of each tile. Defaults to 1024.
+        dtype (np.dtype, optional): dtype of the stored distances, e.g. np.float32. Defaults to np.float64.
+        window (int, optional): Sakoe-Chiba band radius used by DTW. Defaults to None.
 
     Returns:
-        [type]: [description]
+        (np.memmap, np.memmap): combined distance matrix and per variable distance matrixes
     """
     assert len(variables) == len(alphas)
+    if distanceType not in (DistanceType.EUCLIDEAN, DistanceType.DTW):
+        raise ValueError("Unsupported distance type")
     
     N = len(mtseries)
-    
-    # * assumes all mtseries are even and aligned
     D = len(variables)
-    T = mtseries[0].timeLen
-    
-    D_k = np.zeros([D, N, N])
+    os.makedirs(directory, exist_ok=True)
     
-    for k in range(D):
-        varName = variables[k]
-        for i in range(N):
-            for j in range(N):
-                assert isinstance(mtseries[i], MTSerie)
-                D_k[k][i][j] = ts_dtw_distance(mtseries[i].get_serie(varName), mtseries[j].get_serie(varName))
+    D_ks = np.memmap(os.path.join(directory, 'D_k.dat'), dtype=dtype, mode='w+', shape=(D, N, N))
+    D_out = np.memmap(os.path.join(directory, 'D.dat'), dtype=dtype, mode='w+', shape=(N, N))
     
-    D_ks =  np.copy(D_k)
+    series = []
+    for varName in variables:
+        X = stack_variable(mtseries, varName)
+        if distanceType == DistanceType.EUCLIDEAN:
+            assert X is not None
+            series = series + [X]
+        else:
+            series = series + [X if X is not None else [mtserie.get_serie(varName) for mtserie in mtseries]]
     
-    for k in range(D):
-        D_k[k] = np.power(D_k[k], 2) * (alphas[k] ** 2)
-    D = np.sum(D_k, axis=0)
-    D = np.power(D, 1/2)
+    for r0 in range(0, N, block_size):
+        r1 = min(r0 + block_size, N)
+        # * only tiles on or above the diagonal are computed, the transposed tile is mirrored
+        for c0 in range(r0, N, block_size):
+            c1 = min(c0 + block_size, N)
+            tile_sq = np.zeros([r1 - r0, c1 - c0])
+            for k in range(D):
+                if distanceType == DistanceType.EUCLIDEAN:
+                    tile = gram_euclidean_distances(series[k][r0:r1], series[k][c0:c1])
+                else:
+                    tile = np.array([[ts_dtw_distance(series[k][i], series[k][j], window) for j in range(c0, c1)] 
+                                     for i in range(r0, r1)])
+                if r0 == c0:
+                    np.fill_diagonal(tile, 0)
+                D_ks[k, r0:r1, c0:c1] = tile
+                D_ks[k, c0:c1, r0:r1] = tile.T
+                tile_sq = tile_sq + np.power(tile, 2) * (alphas[k] ** 2)
+            tile = np.power(tile_sq, 1/2)
+            D_out[r0:r1, c0:c1] = tile
+            D_out[c0:c1, r0:r1] = tile.T
     
-    return D, D_ks
+    D_ks.flush()
+    D_out.flush()
+    return D_out, D_ks
+
+def blocked_reweight(D_ks, alphas, D_out, block_size = 1024):
+    """
+    Recombines memory-mapped per variable distance matrixes into D_out as 
+    sqrt(sum_k alpha_k^2 * D_k^2), processing block_size rows at a time
+
+    Args:
+        D_ks (np.ndarray): (D, N, N) per variable distance matrixes
+        alphas (List of float): weigth for each variable
+        D_out (np.ndarray): (N, N) output, e.g. a writable np.memmap
+        block_size (int, optional): number of rows per block. Defaults to 1024.
+
+    Returns:
+        np.ndarray: D_out
+    """
+    weights = np.power(alphas, 2)
+    N = D_out.shape[0]
+    for r0 in range(0, N, block_size):
+        r1 = min(r0 + block_size, N)
+        D_out[r0:r1] = np.sqrt(np.tensordot(weights, np.power(D_ks[:, r0:r1], 2), axes=1))
+    if isinstance(D_out, np.memmap):
+        D_out.flush()
+    return D_out
 
 # def mp_distance_matrix(mtseries, variables, alphas, L):
 #     """
@@ -205,3 +433,21 @@ def mds_projection(D):
     results = mds.fit(D)
     return results.embedding_ 
 
+def knn_projection(G, n_components = 2):
+    """
+    Spectral embedding of a sparse k nearest neighbors distance graph, such
+    as the one returned by [knn_graph]. The neighbors graph and its laplacian 
+    stay sparse, so the memory grows with N * k instead of N^2
+
+    Args:
+        G (scipy.sparse.csr_matrix): (N, N) neighbors distance graph
+        n_components (int, optional): dimension of the projection. Defaults to 2.
+
+    Returns:
+        np.ndarray: (N, n_components) coordinates
+    """
+    # * sklearn counts the sample itself as one of the neighbors of the graph
+    k = int(np.min(np.diff(G.indptr))) - 1
+    embedding = manifold.SpectralEmbedding(n_components=n_components, affinity="precomputed_nearest_neighbors", 
+                                           n_neighbors=k, random_state=0)
+    return embedding.fit_transform(G)
@@ -0,0 +1,131 @@
+import threading
+import multiprocessing
+import numpy as np
+from multiprocessing.pool import ThreadPool
+from .mtserie import MTSerie
+from .matrixprofile.utils import PreparedSeries, movconstant
+
+
+class _IndexedSerie:
+    """
+    Prepared FFT of one variable of one mtserie. Nan and Inf values are replaced by zeros
+    in the FFT and the windows that contain them are never reported, neither are the
+    constant windows.
+    """
+    def __init__(self, ts):
+        ts = np.asarray(ts, dtype=float)
+        missing = ~np.isfinite(ts)
+        self.prepared = PreparedSeries(np.where(missing, 0, ts))
+        self.missingCount = np.insert(np.cumsum(missing), 0, 0)
+        self._invalid = {}
+
+    def invalid(self, m):
+        if m not in self._invalid:
+            self._invalid[m] = ((self.missingCount[m:] - self.missingCount[:-m]) > 0) | movconstant(self.prepared.ts, m)
+        return self._invalid[m]
+
+    def distance_profile(self, query):
+        m = len(query)
+        res = self.prepared.mass(query)
+        distances = np.sqrt(np.maximum(res, 0))
+        # * the distances of constant windows are 0/0 or x/0 depending on rounding
+        distances[np.isnan(distances) | self.invalid(m)] = np.inf
+        return distances
+
+
+def _best_matches(distances, threshold, k, exclusionZone):
+    """
+    Positions of up to k non overlapping matches below threshold, sorted by distance
+    """
+    candidates = np.flatnonzero(distances < threshold)
+    if len(candidates) == 0:
+        return candidates
+    candidates = candidates[np.argsort(distances[candidates], kind='stable')]
+
+    selected = []
+    for position in candidates:
+        if all(abs(position - other) > exclusionZone for other in selected):
+            selected.append(position)
+            if len(selected) == k:
+                break
+    return np.array(selected, dtype=int)
+
+
+class SubsequenceIndex:
+    """summary for [SubsequenceIndex]
+
+        Similarity search index over the variables of a set of [MTSerie].
+        The FFT and the window statistics of every serie are computed once,
+        so each query costs one FFT per serie. Series are scanned with a
+        shared k-th best distance, only the positions below it are ranked.
+    """
+    def __init__(self, variables):
+        self.variables = list(variables)
+        self.series = {}
+
+    @property
+    def ids(self) -> list:
+        return list(self.series.keys())
+
+    def add(self, mtserie, identifier):
+        assert isinstance(mtserie, MTSerie)
+        self.series[identifier] = {varName: _IndexedSerie(mtserie.get_serie(varName)) for varName in self.variables}
+
+    def remove(self, identifier):
+        self.series.pop(identifier, None)
+
+    def search(self, query, k = 10, variables = [], exclusion_zone = None, n_jobs = 1):
+        """
+        Top k nearest subsequences to the query, under the z-normalized euclidean
+        distance, across every indexed mtserie and variable
+
+        Args:
+            query (np.ndarray): pattern to search
+            k (int, optional): number of matches. Defaults to 10.
+            variables (List of str, optional): variables to search. Defaults to all indexed variables.
+            exclusion_zone (int, optional): minimum separation between matches in the same serie. Defaults to len(query) / 2.
+            n_jobs (int, optional): number of threads, -1 to use all CPU cores. Defaults to 1.
+
+        Returns:
+            List of (str, str, int, float): (id, variable, position, distance) sorted by distance
+        """
+        query = np.asarray(query, dtype=float)
+        assert query.ndim == 1 and len(query) > 1
+        m = len(query)
+
+        _variables = variables
+        if len(variables) == 0:
+            _variables = self.variables
+        if exclusion_zone is None:
+            exclusion_zone = m / 2
+
+        tasks = [(identifier, varName) for identifier in self.series for varName in _variables
+                 if self.series[identifier][varName].prepared.n >= m]
+
+        # * k-th best distance found so far by any worker, series only contribute positions below it
+        state = {'threshold': np.inf, 'matches': []}
+        lock = threading.Lock()
+
+        def search_chunk(chunk):
+            for identifier, varName in chunk:
+                distances = self.series[identifier][varName].distance_profile(query)
+                positions = _best_matches(distances, state['threshold'], k, exclusion_zone)
+                if len(positions) == 0:
+                    continue
+                with lock:
+                    matches = state['matches'] + [(distances[p], identifier, varName, int(p)) for p in positions]
+                    matches.sort(key=lambda match: match[0])
+                    state['matches'] = matches[:k]
+                    if len(state['matches']) == k:
+                        state['threshold'] = state['matches'][-1][0]
+
+        if n_jobs == -1:
+            n_jobs = multiprocessing.cpu_count()
+        if n_jobs == 1:
+            search_chunk(tasks)
+        else:
+            # * numpy releases the GIL during the FFTs, so threads share the prepared series
+            with ThreadPool(processes=n_jobs) as pool:
+                pool.map(search_chunk, [tasks[i::n_jobs] for i in range(n_jobs)])
+
+        return [(identifier, varName, position, float(distance)) for distance, identifier, varName, position in state['matches']]
@@ -1,4 +1,5 @@
 import numpy as np
+import multiprocessing
 import matplotlib.pyplot as plt
 import json
 from dateutil import parser
@@ -151,6 +152,56 @@ def zNormalize(ts):
 
     return ts
 
+_workerValues = None
+_workerMetric = None
+
+def _init_pairwise_worker(values, metric):
+    global _workerValues, _workerMetric
+    _workerValues = values
+    _workerMetric = metric
+
+def _pairwise_rows(rows):
+    return [[_workerMetric(_workerValues[i], _workerValues[j]) for j in range(i + 1, len(_workerValues))] for i in rows]
+
+def pairwise_condensed(values, metric, n_jobs = 1):
+    """
+    Evaluates a symmetric metric only on the pairs i < j of values
+
+    Args:
+        values (List): elements to compare
+        metric (function): symmetric distance between two elements, it must be picklable if n_jobs != 1
+        n_jobs (int, optional): number of processes, -1 to use all CPU cores. Defaults to 1.
+
+    Returns:
+        np.ndarray: condensed distance matrix, as expected by scipy.spatial.distance.squareform
+    """
+    N = len(values)
+    condensed = np.zeros(N * (N - 1) // 2)
+    if n_jobs == -1:
+        n_jobs = multiprocessing.cpu_count()
+    
+    if n_jobs == 1 or N < 3:
+        pos = 0
+        for i in range(N - 1):
+            for j in range(i + 1, N):
+                condensed[pos] = metric(values[i], values[j])
+                pos = pos + 1
+        return condensed
+    
+    # * rows are interleaved between chunks so every chunk gets a similar number of pairs
+    n_chunks = min(N - 1, 4 * n_jobs)
+    chunks = [list(range(c, N - 1, n_chunks)) for c in range(n_chunks)]
+    # * values are sent once to each worker instead of once per chunk
+    with multiprocessing.Pool(processes=n_jobs, initializer=_init_pairwise_worker, initargs=(values, metric)) as pool:
+        results = pool.map(_pairwise_rows, chunks)
+    
+    for rows, rowsDistances in zip(chunks, results):
+        for i, distances in zip(rows, rowsDistances):
+            # * start of row i in the condensed layout
+            begin = i * N - i * (i + 1) // 2
+            condensed[begin: begin + N - i - 1] = distances
+    return condensed
+
 # todo: document this
 def mtserieQueryToJsonStr(query):
     assert isinstance(query, dict)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from ..core.matrixprofile import backend, scrimp, matrixProfile
+
+pytestmark = pytest.mark.skipif(backend.numba is None, reason='numba is not installed')
+
+
+def _run(name, func, *args):
+    previous = backend.get_backend()
+    backend.set_backend(name)
+    try:
+        return func(*[np.copy(a) if isinstance(a, np.ndarray) else a for a in args])
+    finally:
+        backend.set_backend(previous)
+
+def _assert_backends_equal(func, *args):
+    expected = _run('numpy', func, *args)
+    result = _run('numba', func, *args)
+    if not isinstance(expected, tuple):
+        expected, result = (expected,), (result,)
+    for e, r in zip(expected, result):
+        np.testing.assert_allclose(r, e, rtol=1e-10, atol=1e-8)
+
+def _serie(n, seed):
+    return np.random.default_rng(seed).normal(size=n).cumsum()
+
+@pytest.mark.parametrize('idx', [0, 1, 37, 170])
+def test_calc_curlastz(idx):
+    n, m = 200, 16
+    profile_len = n - m + 1
+    _assert_backends_equal(scrimp.calc_curlastz, _serie(n, idx), m, n, idx, profile_len, np.zeros(profile_len))
+
+@pytest.mark.parametrize('idx, idx_diff, step_size', [(100, 40, 30), (20, 3, 50), (150, 30, 4), (5, 90, 10)])
+def test_calc_dotproduct_begin_idx(idx, idx_diff, step_size):
+    n, m = 200, 16
+    ts = _serie(n, idx)
+    dp = np.random.default_rng(idx_diff).normal(size=n - m + 1)
+    beginidx = scrimp.calc_begin_idx(idx, step_size, idx_diff)
+    _assert_backends_equal(scrimp.calc_dotproduct_begin_idx, ts, dp, beginidx, idx, idx_diff, m, idx + idx_diff)
+
+@pytest.mark.parametrize('beginidx, endidx, idx_diff', [(0, 50, 10), (30, 120, 3), (60, 61, 100), (5, 5, 1)])
+def test_apply_update_positions(beginidx, endidx, idx_diff):
+    profile_len = 185
+    rng = np.random.default_rng(endidx)
+    matrix_profile = rng.uniform(size=profile_len)
+    matrix_profile[::7] = np.inf
+    mp_index = rng.integers(0, profile_len, size=profile_len)
+    refine_distance = rng.uniform(size=profile_len)
+    _assert_backends_equal(scrimp.apply_update_positions, matrix_profile, mp_index, refine_distance, 
+                           beginidx, endidx, np.arange(profile_len), idx_diff)
+
+@pytest.mark.parametrize('lenA, lenB', [(300, None), (240, 310), (310, 240)])
+def test_stomp_loop(lenA, lenB):
+    tsA = _serie(lenA, 1)
+    tsB = None if lenB is None else _serie(lenB, 2)
+    _assert_backends_equal(matrixProfile.stomp, tsA, 20, tsB)
+
+def test_stomp_loop_constant_segment():
+    tsA = _serie(400, 3)
+    tsA[100:180] = 1.5
+    _assert_backends_equal(matrixProfile.stomp, tsA, 20)
+    _assert_backends_equal(matrixProfile.stomp, _serie(300, 4), 20, tsA)
+
+def test_scrimp_plus_plus():
+    _assert_backends_equal(scrimp.scrimp_plus_plus, _serie(400, 5), 24, 0.25, None, 7)
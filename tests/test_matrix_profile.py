@@ -0,0 +1,74 @@
+import threading
+import time
+import numpy as np
+from ..core.matrix_profile import matrix_profiles, subsequences_indexes, valid_segments, segments_indexes, mass_distance_profile, naive_distance_profile, ab_join, zNormalize_euclidian
+
+
+def _serie_with_gaps(n = 200, seed = 0):
+    ts = np.random.default_rng(seed).normal(size=n).cumsum()
+    ts[40:43] = np.nan
+    ts[120] = np.inf
+    return ts
+
+def test_mass_distance_profile_segments_match_unsegmented_profile():
+    L = 12
+    tsA = _serie_with_gaps(seed=1)
+    tsB = _serie_with_gaps(seed=2)
+    segments = valid_segments(tsB, L)
+    indexes = segments_indexes(segments, L)
+    
+    # * cross join
+    dp, dpIndexes = mass_distance_profile(tsA, 60, L, searchIndexes=indexes, tsB=tsB, segments=segments)
+    expected, _ = naive_distance_profile(tsA, 60, L, searchIndexes=indexes, tsB=tsB)
+    assert len(dp) == len(indexes)
+    np.testing.assert_array_equal(dpIndexes, indexes)
+    np.testing.assert_allclose(dp, expected, atol=1e-6)
+    
+    # * self join
+    segments = valid_segments(tsA, L)
+    indexes = segments_indexes(segments, L)
+    dp, _ = mass_distance_profile(tsA, 60, L, searchIndexes=indexes, segments=segments)
+    expected, _ = naive_distance_profile(tsA, 60, L, searchIndexes=indexes)
+    assert len(dp) == len(indexes)
+    np.testing.assert_allclose(dp, expected, atol=1e-6)
+
+def test_mass_distance_profile_without_segments():
+    L = 12
+    tsA = _serie_with_gaps(seed=3)
+    indexes = subsequences_indexes(tsA, L)
+    dp, _ = mass_distance_profile(tsA, 60, L, searchIndexes=indexes)
+    expected, _ = naive_distance_profile(tsA, 60, L, searchIndexes=indexes)
+    np.testing.assert_allclose(dp, expected, atol=1e-6)
+
+def test_ab_join_matches_brute_force():
+    L = 10
+    tsA = _serie_with_gaps(n=130, seed=4)[30:]
+    tsB = _serie_with_gaps(n=150, seed=5)
+    profile, index = ab_join(tsA, tsB, L)
+    
+    indexes_A = subsequences_indexes(tsA, L)
+    indexes_B = subsequences_indexes(tsB, L)
+    assert np.all(np.isnan(np.delete(profile, indexes_A)))
+    for i in indexes_A:
+        distances = [zNormalize_euclidian(tsA[i:i + L], tsB[j:j + L]) for j in indexes_B]
+        assert np.isclose(profile[i], np.min(distances), atol=1e-6)
+        assert index[i] == indexes_B[np.argmin(distances)]
+
+def test_subsequences_indexes_returns_a_list():
+    ts = _serie_with_gaps(n=150)
+    indexes = subsequences_indexes(ts, 8)
+    assert isinstance(indexes, list)
+    expected = [i for i in range(len(ts) - 7) if np.all(np.isfinite(ts[i:i + 8]))]
+    assert indexes == expected
+
+def test_matrix_profiles_cancel_does_not_wait_for_running_jobs():
+    ts = np.random.default_rng(6).normal(size=30000).cumsum()
+    cancel = threading.Event()
+    timer = threading.Timer(0.3, cancel.set)
+    timer.start()
+    
+    start = time.perf_counter()
+    results = list(matrix_profiles([('a', ts), ('b', ts)], 50, n_jobs=2, cancel=cancel))
+    timer.join()
+    assert results == []
+    assert time.perf_counter() - start < 3
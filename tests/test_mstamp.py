@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from ..core.matrixprofile.mstamp import mstomp
+
+
+def _brute_force_mstomp(ts, m):
+    W = np.lib.stride_tricks.sliding_window_view(ts, m, axis=1)
+    std = W.std(axis=-1, keepdims=True)
+    Z = (W - W.mean(axis=-1, keepdims=True)) / np.where(std == 0, 1, std)
+    # * (d, l, l) squared distances of every dimension
+    D = ((Z[:, :, np.newaxis] - Z[:, np.newaxis]) ** 2).sum(axis=-1)
+    l = D.shape[1]
+    # * constant subsequences are never matched in their dimension
+    constant = np.all(W == W[..., :1], axis=-1)
+    for k in range(len(ts)):
+        D[k, constant[k], :] = np.inf
+        D[k, :, constant[k]] = np.inf
+    for i in range(l):
+        D[:, i, int(max(0, i - np.round(m / 2))):int(min(i + np.round(m / 2 + 1), l))] = np.inf
+
+    D.sort(axis=0)
+    counts = np.arange(1, len(ts) + 1)[:, np.newaxis, np.newaxis]
+    D = np.cumsum(D, axis=0) / counts
+    return np.sqrt(D.min(axis=1)), D.argmin(axis=1)
+
+@pytest.mark.parametrize('d, m', [(1, 10), (3, 16), (4, 7)])
+def test_mstomp_matches_brute_force(d, m):
+    ts = np.random.default_rng(d).normal(size=(d, 180)).cumsum(axis=1)
+    expected, expectedIndex = _brute_force_mstomp(ts, m)
+
+    mp, mpIndex = mstomp(ts, m)
+    assert mp.shape == (d, 180 - m + 1)
+    np.testing.assert_allclose(mp, expected, atol=1e-6)
+    np.testing.assert_array_equal(mpIndex, expectedIndex)
+
+def test_mstomp_never_matches_constant_subsequences():
+    ts = np.random.default_rng(0).normal(size=(2, 400)).cumsum(axis=1)
+    ts[0, 200:260] = ts[0, 200]
+    expected, expectedIndex = _brute_force_mstomp(ts, 10)
+
+    mp, mpIndex = mstomp(ts, 10)
+    assert not np.any(mp == 0)
+    np.testing.assert_allclose(mp, expected, atol=1e-6)
+    finite = np.isfinite(expected)
+    np.testing.assert_array_equal(mpIndex[finite], expectedIndex[finite])
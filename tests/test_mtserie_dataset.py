@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+# * mtserie depends on the matrixprofile package
+pytest.importorskip('matrixprofile')
+
+from ..core.mtserie import MTSerie
+from ..core.mtserie_dataset import MTSerieDataset
+from ..core.distances import DistanceType
+
+
+VARIABLES = ['v0', 'v1', 'v2']
+
+def _mtseries(N, T = 40, seed = 0):
+    rng = np.random.default_rng(seed)
+    return [MTSerie.fromDArray(rng.normal(size=(len(VARIABLES), T)).cumsum(axis=1), labels=VARIABLES) for _ in range(N)]
+
+def _dataset(mtseries):
+    dataset = MTSerieDataset()
+    for i, mtserie in enumerate(mtseries):
+        dataset.add(mtserie, str(i))
+    return dataset
+
+def _brute_force_distances(mtseries, alphas):
+    D_ks = np.array([[[np.linalg.norm(a.get_serie(varName) - b.get_serie(varName)) for b in mtseries] for a in mtseries]
+                     for varName in VARIABLES])
+    return np.sqrt(np.tensordot(np.power(alphas, 2), D_ks ** 2, axes=1)), D_ks
+
+@pytest.mark.parametrize('distanceType', [DistanceType.EUCLIDEAN, DistanceType.DTW])
+def test_add_and_remove_match_full_recompute(distanceType):
+    mtseries = _mtseries(9)
+    alphas = [1.0, 0.5, 2.0]
+    dataset = _dataset(mtseries[:6])
+    dataset.compute_distance_matrix(alphas=alphas, distanceType=distanceType, window=4)
+
+    for i in range(6, 9):
+        dataset.add(mtseries[i], str(i))
+    dataset.remove('1')
+    dataset.remove('7')
+
+    expected = _dataset([mtserie for i, mtserie in enumerate(mtseries) if i not in (1, 7)])
+    expected.compute_distance_matrix(alphas=alphas, distanceType=distanceType, window=4)
+    np.testing.assert_allclose(dataset.distanceMatrix, expected.distanceMatrix, atol=1e-10)
+    np.testing.assert_allclose(dataset.distanceMatrix_k, expected.distanceMatrix_k, atol=1e-10)
+
+def test_reweight_matches_weighted_distances():
+    mtseries = _mtseries(8)
+    dataset = _dataset(mtseries)
+    dataset.compute_distance_matrix(alphas=[1.0, 1.0, 1.0])
+
+    alphas = [0.2, 1.5, 3.0]
+    expected, D_ks = _brute_force_distances(mtseries, alphas)
+    np.testing.assert_allclose(dataset.reweight(alphas), expected, atol=1e-10)
+    np.testing.assert_allclose(dataset.distanceMatrix_k, D_ks, atol=1e-10)
+    # * a new call that only changes the alphas reweights the cached distances
+    dataset.compute_distance_matrix(alphas=[1.0, 1.0, 1.0])
+    np.testing.assert_allclose(dataset.distanceMatrix, _brute_force_distances(mtseries, [1.0, 1.0, 1.0])[0], atol=1e-10)
+
+@pytest.mark.parametrize('distanceType', [DistanceType.EUCLIDEAN, DistanceType.DTW])
+def test_memmap_matches_in_memory_matrixes(tmp_path, distanceType):
+    mtseries = _mtseries(11)
+    alphas = [1.0, 0.5, 2.0]
+    inMemory = _dataset(mtseries)
+    inMemory.compute_distance_matrix(alphas=alphas, distanceType=distanceType, window=4)
+
+    blocked = _dataset(mtseries)
+    blocked.compute_distance_matrix(alphas=alphas, distanceType=distanceType, window=4,
+                                    memmap_dir=str(tmp_path), block_size=4)
+    np.testing.assert_allclose(blocked.distanceMatrix, inMemory.distanceMatrix, atol=1e-10)
+    np.testing.assert_allclose(blocked.distanceMatrix_k, inMemory.distanceMatrix_k, atol=1e-10)
+
+    alphas = [2.0, 0.1, 1.0]
+    np.testing.assert_allclose(blocked.reweight(alphas), inMemory.reweight(alphas), atol=1e-10)
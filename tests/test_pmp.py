@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from ..core.matrixprofile.pmp import pan_matrix_profile
+from ..core.matrixprofile import matrixProfile
+
+
+@pytest.mark.parametrize('windows', [range(8, 30), [5, 9, 12, 13, 27], [7]])
+def test_pan_matrix_profile_matches_stomp(windows):
+    ts = np.random.default_rng(1).normal(size=400).cumsum() + 100
+    pmp = pan_matrix_profile(ts, windows)
+    
+    for m in windows:
+        profile, index = pmp.get(m)
+        expected, expectedIndex = matrixProfile.stomp(ts, m)
+        assert len(profile) == len(ts) - m + 1
+        np.testing.assert_allclose(profile, expected, atol=1e-7)
+        np.testing.assert_array_equal(index, expectedIndex)
+
+def test_pan_matrix_profile_lookup():
+    ts = np.random.default_rng(2).normal(size=100).cumsum()
+    pmp = pan_matrix_profile(ts, [10, 6, 10, 8])
+    np.testing.assert_array_equal(pmp.windows, [6, 8, 10])
+    assert 8 in pmp and 7 not in pmp
+    with pytest.raises(KeyError):
+        pmp.get(7)
+    profile, _ = pmp.get(10)
+    np.testing.assert_allclose(pmp.get(10, normalized=True)[0], profile / np.sqrt(20))
+    assert np.all(np.isnan(pmp.profiles[2, len(ts) - 10 + 1:]))
+
+def test_pan_matrix_profile_never_matches_constant_subsequences():
+    ts = np.random.default_rng(0).normal(size=2000).cumsum()
+    ts[1000:1100] = ts[1000]
+    windows = [10, 16, 25]
+    pmp = pan_matrix_profile(ts, windows)
+    
+    for m in windows:
+        profile, index = pmp.get(m)
+        expected, expectedIndex = matrixProfile.stomp(ts, m)
+        constant = np.isinf(expected)
+        assert np.count_nonzero(constant) == 100 - m + 1
+        assert not np.any(profile == 0)
+        np.testing.assert_array_equal(np.isinf(profile), constant)
+        np.testing.assert_allclose(profile[~constant], expected[~constant], atol=1e-6)
+        np.testing.assert_array_equal(index[~constant], expectedIndex[~constant])
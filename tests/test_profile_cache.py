@@ -0,0 +1,42 @@
+import os
+import numpy as np
+from ..core.profile_cache import ProfileCache
+
+
+def _profile(seed, n = 100):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=n), rng.uniform(size=n), rng.integers(0, n, size=n)
+
+def test_put_evicts_least_recently_used_without_listing(tmp_path, monkeypatch):
+    series = [_profile(seed) for seed in range(4)]
+    cache = ProfileCache(str(tmp_path))
+    ts, mp, index = series[0]
+    cache.put(ts, 10, 'stomp', (mp, index))
+    entryBytes = cache._totalBytes
+    cache.maxBytes = 3 * entryBytes
+    
+    listed = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, 'listdir', lambda path: listed.append(path) or listdir(path))
+    for ts, mp, index in series[1:3]:
+        cache.put(ts, 10, 'stomp', (mp, index))
+    # * the first serie becomes the most recently used
+    assert cache.get(series[0][0], 10, 'stomp') is not None
+    cache.put(series[3][0], 10, 'stomp', series[3][1:])
+    assert listed == []
+    
+    assert cache.get(series[1][0], 10, 'stomp') is None
+    for ts, mp, index in [series[0], series[2], series[3]]:
+        cachedMp, cachedIndex = cache.get(ts, 10, 'stomp')
+        np.testing.assert_array_equal(cachedMp, mp)
+        np.testing.assert_array_equal(cachedIndex, index)
+    assert cache._totalBytes == 3 * entryBytes
+    assert len([name for name in listdir(str(tmp_path)) if name.endswith('.npy')]) == 6
+
+def test_reopened_cache_tracks_existing_files(tmp_path):
+    ts, mp, index = _profile(0)
+    ProfileCache(str(tmp_path)).put(ts, 10, 'scrimp++', (mp, index))
+    cache = ProfileCache(str(tmp_path))
+    assert cache._totalBytes > 0
+    cache.clear()
+    assert cache._totalBytes == 0 and cache.get(ts, 10, 'scrimp++') is None
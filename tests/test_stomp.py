@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from ..core.matrixprofile import matrixProfile, backend, distanceProfile, order
+
+
+def _brute_force_ab_join(tsA, tsB, m):
+    def windows(ts):
+        W = np.lib.stride_tricks.sliding_window_view(ts, m)
+        return (W - W.mean(axis=1, keepdims=True)) / W.std(axis=1, keepdims=True)
+    D = np.sqrt(((windows(tsA)[:, np.newaxis] - windows(tsB)[np.newaxis]) ** 2).sum(axis=-1))
+    return D.min(axis=0), D.argmin(axis=0)
+
+@pytest.fixture(params=backend.BACKENDS)
+def stomp_backend(request):
+    if request.param == 'numba' and backend.numba is None:
+        pytest.skip('numba is not installed')
+    previous = backend.get_backend()
+    backend.set_backend(request.param)
+    yield request.param
+    backend.set_backend(previous)
+
+@pytest.mark.parametrize('lenA, lenB', [(200, 200), (160, 230), (230, 160)])
+def test_stomp_ab_join_matches_brute_force(stomp_backend, lenA, lenB):
+    rng = np.random.default_rng(lenA + lenB)
+    tsA = rng.normal(size=lenA).cumsum()
+    tsB = rng.normal(size=lenB).cumsum()
+    expected, expectedIndex = _brute_force_ab_join(tsA, tsB, 16)
+    
+    for n_threads in (None, 3):
+        mp, mpIndex = matrixProfile.stomp(tsA, 16, tsB, n_threads=n_threads)
+        np.testing.assert_allclose(mp, expected, atol=1e-8)
+        np.testing.assert_array_equal(mpIndex, expectedIndex)
+
+def _brute_force_join(tsA, tsB, m, selfJoin):
+    """All pairs join where constant subsequences are never matched, with stomp's exclusion zone."""
+    def windows(ts):
+        W = np.lib.stride_tricks.sliding_window_view(ts, m)
+        std = W.std(axis=1)
+        Z = (W - W.mean(axis=1, keepdims=True)) / np.where(std == 0, 1, std)[:, np.newaxis]
+        return Z, np.all(W == W[:, :1], axis=1)
+    (ZA, constantA), (ZB, constantB) = windows(tsA), windows(tsB)
+    D = np.sqrt(((ZA[:, np.newaxis] - ZB[np.newaxis]) ** 2).sum(axis=-1))
+    D[constantA, :] = np.inf
+    D[:, constantB] = np.inf
+    if selfJoin:
+        for i in range(len(D)):
+            D[i, int(max(0, i - np.round(m / 2))):int(i + np.round(m / 2 + 1))] = np.inf
+    return D.min(axis=0), D.argmin(axis=0), constantB
+
+@pytest.mark.parametrize('selfJoin', [True, False])
+def test_stomp_constant_segments_match_brute_force(stomp_backend, selfJoin):
+    rng = np.random.default_rng(1)
+    tsA = rng.normal(size=600).cumsum()
+    tsA[150:250] = 2.0
+    tsB = None
+    if not selfJoin:
+        tsB = rng.normal(size=450).cumsum()
+        tsB[50:120] = -1.0
+    expected, expectedIndex, constant = _brute_force_join(tsA, tsA if selfJoin else tsB, 24, selfJoin)
+    
+    for n_threads in (None, 2, 3):
+        mp, mpIndex = matrixProfile.stomp(tsA, 24, tsB, n_threads=n_threads)
+        assert not np.any(np.isnan(mp))
+        assert np.all(np.isinf(mp[constant]))
+        # windows with a single step at their ends are exact matches, their distance is the square root of a rounding error
+        np.testing.assert_allclose(mp, expected, atol=1e-6)
+        np.testing.assert_array_equal(mpIndex[~constant], expectedIndex[~constant])
+
+@pytest.mark.parametrize('flat', [False, True])
+def test_stomp_inplace_matches_reference_kernel(stomp_backend, flat):
+    rng = np.random.default_rng(7)
+    ts = rng.normal(size=500).cumsum()
+    if flat:
+        ts[200:260] = 1.0
+    expected, expectedIndex = matrixProfile._matrixProfile_stomp(ts, 20, order.linearOrder, distanceProfile.STOMPDistanceProfile)
+    
+    mp, mpIndex = matrixProfile.stomp(ts, 20)
+    np.testing.assert_array_equal(mp, expected)
+    np.testing.assert_array_equal(mpIndex, expectedIndex)
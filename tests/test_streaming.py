@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from ..core.matrixprofile.streaming import StreamingMatrixProfile
+
+
+def _brute_force_profiles(values, m, exclusionZone):
+    W = np.lib.stride_tricks.sliding_window_view(values, m)
+    std = W.std(axis=1)
+    Z = (W - W.mean(axis=1, keepdims=True)) / np.where(std == 0, 1, std)[:, np.newaxis]
+    D = np.sqrt(((Z[:, np.newaxis] - Z[np.newaxis]) ** 2).sum(axis=-1))
+    #Constant subsequences are never matched
+    constant = np.all(W == W[:, :1], axis=1)
+    D[constant, :] = np.inf
+    D[:, constant] = np.inf
+    i, j = np.indices(D.shape)
+    left = np.where(j < i - exclusionZone, D, np.inf)
+    right = np.where(j > i + exclusionZone, D, np.inf)
+    return left.min(axis=1), right.min(axis=1)
+
+@pytest.mark.parametrize('horizon', [None, 60, 150])
+def test_profiles_match_the_current_window(horizon):
+    m = 12
+    stream = StreamingMatrixProfile(m, horizon=horizon, capacity=64)
+    stream.extend(np.random.default_rng(0).normal(size=400).cumsum())
+    
+    leftExpected, rightExpected = _brute_force_profiles(stream.values, m, stream.exclusionZone)
+    leftMp, leftIndex = stream.left_profile
+    rightMp, _ = stream.right_profile
+    np.testing.assert_allclose(leftMp, leftExpected, atol=1e-6)
+    np.testing.assert_allclose(rightMp, rightExpected, atol=1e-6)
+    np.testing.assert_allclose(stream.profile[0], np.minimum(leftExpected, rightExpected), atol=1e-6)
+    
+    found = leftIndex >= 0
+    assert np.all(leftIndex[found] >= stream.offset)
+    assert np.array_equal(found, np.isfinite(leftExpected))
+
+@pytest.mark.parametrize('horizon', [None, 250])
+def test_constant_subsequences_are_never_matched(horizon):
+    m = 12
+    values = np.random.default_rng(1).normal(size=400).cumsum()
+    values[200:260] = 3.0
+    stream = StreamingMatrixProfile(m, horizon=horizon, capacity=64)
+    stream.extend(values)
+    
+    leftExpected, rightExpected = _brute_force_profiles(stream.values, m, stream.exclusionZone)
+    leftMp, _ = stream.left_profile
+    rightMp, _ = stream.right_profile
+    np.testing.assert_allclose(leftMp, leftExpected, atol=1e-6)
+    np.testing.assert_allclose(rightMp, rightExpected, atol=1e-6)
+    assert not np.any(stream.profile[0] == 0)
+
+def test_left_neighbor_only_searches_its_row():
+    m = 12
+    stream = StreamingMatrixProfile(m, horizon=150)
+    stream.extend(np.random.default_rng(2).normal(size=400).cumsum())
+    window = stream._profile_slice()
+    stale = np.flatnonzero(stream._leftStale[window])
+    assert len(stale) > 1
+    
+    leftExpected, _ = _brute_force_profiles(stream.values, m, stream.exclusionZone)
+    distance, _ = stream.left_neighbor(stream.offset + stale[0])
+    np.testing.assert_allclose(distance, leftExpected[stale[0]], atol=1e-6)
+    assert np.count_nonzero(stream._leftStale[window]) == len(stale) - 1
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+# * mtserie depends on the matrixprofile package
+pytest.importorskip('matrixprofile')
+
+from ..core.mtserie import MTSerie
+from ..core.subsequence_search import SubsequenceIndex
+
+
+VARIABLES = ['v0', 'v1']
+
+def _brute_force_search(mtseries, query, k, exclusionZone):
+    m = len(query)
+    z = (query - query.mean()) / query.std()
+    matches = []
+    for identifier, mtserie in mtseries.items():
+        for varName in VARIABLES:
+            W = np.lib.stride_tricks.sliding_window_view(mtserie.get_serie(varName), m)
+            with np.errstate(invalid='ignore'):
+                Z = (W - W.mean(axis=1, keepdims=True)) / W.std(axis=1, keepdims=True)
+            distances = np.sqrt(((Z - z) ** 2).sum(axis=1))
+            distances[~np.isfinite(distances) | np.all(W == W[:, :1], axis=1)] = np.inf
+            # * greedy non overlapping matches of each serie
+            selected = []
+            for position in np.argsort(distances, kind='stable'):
+                if distances[position] == np.inf or len(selected) == k:
+                    break
+                if all(abs(position - other) > exclusionZone for other in selected):
+                    selected.append(position)
+            matches += [(distances[p], identifier, varName, int(p)) for p in selected]
+    matches.sort(key=lambda match: match[0])
+    return matches[:k]
+
+@pytest.mark.parametrize('n_jobs', [1, 3])
+@pytest.mark.parametrize('k', [10, 300])
+def test_search_matches_brute_force(n_jobs, k):
+    rng = np.random.default_rng(0)
+    mtseries = {}
+    for i in range(6):
+        X = rng.normal(size=(len(VARIABLES), 300)).cumsum(axis=1)
+        X[0, 50:55] = np.nan
+        X[1, 120] = np.inf
+        X[1, 200:240] = X[1, 200]
+        mtseries[str(i)] = MTSerie.fromDArray(X, labels=VARIABLES)
+    index = SubsequenceIndex(VARIABLES)
+    for identifier, mtserie in mtseries.items():
+        index.add(mtserie, identifier)
+    index.remove('4')
+    del mtseries['4']
+
+    query = rng.normal(size=24).cumsum()
+    expected = _brute_force_search(mtseries, query, k, 12)
+    found = index.search(query, k=k, n_jobs=n_jobs)
+    assert [(identifier, varName, position) for identifier, varName, position, _ in found] == \
+        [(identifier, varName, position) for _, identifier, varName, position in expected]
+    np.testing.assert_allclose([distance for *_, distance in found], [distance for distance, *_ in expected], atol=1e-6)